@@ -49,6 +49,11 @@ def initialize_app():
         
         # Create database tables
         db.create_all()
+        
+        # create_all() skips tables that already exist, so add indexes introduced later
+        for table in (models.EthernetIPTag.__table__, models.SNMPObject.__table__):
+            for index in table.indexes:
+                index.create(db.engine, checkfirst=True)
         logger.info("Database tables created")
         
         # Import and register blueprint
@@ -110,8 +115,9 @@ def initialize_app():
             
             # Connect SNMP devices
             snmp_configs = db.session.query(models.SNMPConfig).filter_by(enabled=True).all()
+            snmp_results = snmp_service.connect_all(snmp_configs)
             for config in snmp_configs:
-                success, message = snmp_service.connect_device(config)
+                success, message = snmp_results[config.id]
                 if success:
                     logger.info(f"✓ Connected to SNMP device: {config.name}")
                 else:
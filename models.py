@@ -57,6 +57,10 @@ class EthernetIPTag(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     config = db.relationship('EthernetIPConfig', backref=db.backref('tags', lazy=True, cascade='all, delete-orphan'))
+    
+    __table_args__ = (
+        db.Index('idx_eip_tag_config_enabled', 'config_id', 'enabled'),
+    )
 
 class SNMPObject(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -74,6 +78,10 @@ class SNMPObject(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     config = db.relationship('SNMPConfig', backref=db.backref('objects', lazy=True, cascade='all, delete-orphan'))
+    
+    __table_args__ = (
+        db.Index('idx_snmp_object_config_enabled', 'config_id', 'enabled'),
+    )
 
 
 class DataLog(db.Model):
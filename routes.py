@@ -26,6 +26,13 @@ def get_services():
     return ethernetip_service, snmp_service, mqtt_service, data_logging_service, polling_service
 
 
+def bump_config_cache(kind):
+    """Tell the polling service that configs of a kind ('eip', 'snmp', 'mqtt') changed"""
+    polling_service = current_app.config.get('polling_service')
+    if polling_service:
+        polling_service.bump_config_cache(kind)
+
+
 @main_bp.route('/')
 def dashboard():
     eip_configs = db.session.query(EthernetIPConfig).filter_by(enabled=True).all()
@@ -168,6 +175,7 @@ def config_ethernetip():
             else:
                 flash('EthernetIP configuration added successfully', 'success')
             
+            bump_config_cache('eip')
             return redirect(url_for('main.config_ethernetip'))
         
         elif action == 'update':
@@ -243,6 +251,7 @@ def config_ethernetip():
                 else:
                     flash(f'Connection failed: {message}', 'error')
         
+        bump_config_cache('eip')
         return redirect(url_for('main.config_ethernetip'))
     
     # GET request with pagination and filtering
@@ -458,6 +467,8 @@ def add_detected_ethernetip_devices():
                 db.session.rollback()
                 continue
         
+        bump_config_cache('eip')
+        
         return jsonify({
             'success': True,
             'message': f'Successfully added {added_count} device(s)',
@@ -618,6 +629,7 @@ def config_snmp():
                 db.session.commit()
                 flash('SNMP configuration deleted successfully', 'success')
         
+        bump_config_cache('snmp')
         return redirect(url_for('main.config_snmp'))
     
     # Build query with filters
@@ -674,7 +686,7 @@ def snmp_discover_objects():
             return jsonify({'success': False, 'message': 'SNMP service not available'}), 503
         
         logger.info(f"Starting OID discovery for {config.name} ({config.host})")
-        success, objects = snmp_service.discover_objects(config, base_oid)
+        success, objects = snmp_service.discover_objects(config, base_oid, refresh=True)
         logger.info(f"Discovery completed: {len(objects)} OIDs found")
         
         response_data = {
@@ -732,7 +744,7 @@ def snmp_discover_objects_temp():
             return jsonify({'success': False, 'message': 'SNMP service not available'}), 503
         
         logger.info(f"Starting OID discovery for temp device ({host})")
-        success, objects = snmp_service.discover_objects(temp_config, base_oid)
+        success, objects = snmp_service.discover_objects(temp_config, base_oid, refresh=True)
         logger.info(f"Discovery completed: {len(objects)} OIDs found")
         
         return jsonify({
@@ -838,19 +850,23 @@ def add_detected_snmp_devices():
                 
                 # Discover and add OIDs
                 if snmp_service:
-                    success, objects = snmp_service.discover_objects(config, '1.3.6.1.2.1')
-                    if success:
-                        for obj in objects[:20]:  # Limit to first 20 OIDs
-                            snmp_obj = SNMPObject(
-                                config_id=config.id,
-                                oid=obj['oid'],
-                                name=obj.get('name', 'Unknown'),
-                                data_type=obj.get('data_type', 'Unknown'),
-                                access=obj.get('access', 'read-only'),
-                                status=obj.get('status', 'current'),
-                                enabled=True
-                            )
-                            db.session.add(snmp_obj)
+                    success, columns = snmp_service.discover_columns(config, '1.3.6.1.2.1', refresh=True)
+                    if success and columns['oid']:
+                        from sqlalchemy import insert
+                        
+                        # Limit to first 20 OIDs; rows become dicts only here, for one executemany insert
+                        db.session.execute(insert(SNMPObject), [
+                            {
+                                'config_id': config.id,
+                                'oid': oid,
+                                'name': name or 'Unknown',
+                                'data_type': data_type or 'Unknown',
+                                'access': 'read-only',
+                                'status': 'current',
+                                'enabled': True
+                            }
+                            for oid, name, data_type in zip(columns['oid'][:20], columns['name'][:20], columns['data_type'][:20])
+                        ])
                 
                 db.session.commit()
                 added_count += 1
@@ -861,6 +877,8 @@ def add_detected_snmp_devices():
                 db.session.rollback()
                 continue
         
+        bump_config_cache('snmp')
+        
         return jsonify({
             'success': True,
             'message': f'Successfully added {added_count} device(s)',
@@ -943,6 +961,10 @@ def config_mqtt():
                 config.enabled = request.form.get('enabled') == 'on'
                 db.session.commit()
                 
+                # A disabled broker no longer publishes, so drop its share of the publisher client
+                if mqtt_service and not config.enabled:
+                    mqtt_service.release_client(config.id)
+                
                 # Restart subscriber if subscribe topic changed
                 if mqtt_service and config.subscribe_topic:
                     mqtt_service.restart_subscriber(config, current_app._get_current_object())
@@ -953,10 +975,13 @@ def config_mqtt():
             config_id = request.form.get('config_id')
             config = MQTTConfig.query.get(config_id)
             if config:
+                if mqtt_service:
+                    mqtt_service.release_client(config.id)
                 db.session.delete(config)
                 db.session.commit()
                 flash('MQTT configuration deleted successfully', 'success')
         
+        bump_config_cache('mqtt')
         return redirect(url_for('main.config_mqtt'))
     
     # GET request with pagination and filtering
@@ -1079,6 +1104,7 @@ def objects():
             )
             db.session.add(obj)
             db.session.commit()
+            bump_config_cache('snmp')
             flash('SNMP Object added successfully', 'success')
         
         elif action == 'update':
@@ -1095,6 +1121,7 @@ def objects():
                 obj.poll_rate = int(request.form.get('poll_rate', 5000))
                 obj.enabled = request.form.get('enabled') == 'on'
                 db.session.commit()
+                bump_config_cache('snmp')
                 flash('SNMP Object updated successfully', 'success')
         
         elif action == 'delete':
@@ -1103,6 +1130,7 @@ def objects():
             if obj:
                 db.session.delete(obj)
                 db.session.commit()
+                bump_config_cache('snmp')
                 flash('SNMP Object deleted successfully', 'success')
         
         elif action == 'read':
@@ -26,6 +26,26 @@ class DataLoggingService:
             db.session.rollback()
             return False
     
+    def log_values(self, entries, session=None):
+        """Insert many log rows in one transaction.
+        
+        entries are dicts with source_type, source_id, source_name, value and
+        timestamp. session defaults to db.session; pass another to write
+        without an app context.
+        """
+        session = session or db.session
+        try:
+            session.bulk_insert_mappings(DataLog, [
+                {**entry, 'value': str(entry['value']) if entry.get('value') is not None else None}
+                for entry in entries
+            ])
+            session.commit()
+            return True
+        except Exception as e:
+            logger.error(f"Failed to log {len(entries)} values: {str(e)}")
+            session.rollback()
+            return False
+    
     def get_history(self, source_type, source_id, hours=24, limit=1000):
         try:
             since = datetime.utcnow() - timedelta(hours=hours)
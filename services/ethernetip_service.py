@@ -227,6 +227,7 @@ class EthernetIPService:
     def __init__(self):
         self._connection_status = {}  # Dict to store status per device ID
         self._active_connections = {}  # Dict to store active connections per device ID
+        self._status_listeners = []  # callback(device_id, connected) on connected-flag changes
         
         logger.info("=" * 70)
         if USE_MOCK_PLC:
@@ -267,6 +268,25 @@ class EthernetIPService:
             }
         return self._connection_status
     
+    def add_status_listener(self, callback):
+        """Register callback(device_id, connected), called whenever a device's connected flag changes"""
+        self._status_listeners.append(callback)
+    
+    def _set_status(self, device_id, connected, message):
+        """Record a device's status and notify listeners if its connected flag changed"""
+        previous = self._connection_status.get(device_id)
+        self._connection_status[device_id] = {
+            'connected': connected,
+            'last_check': datetime.utcnow(),
+            'message': message
+        }
+        if previous is None or previous.get('connected') != connected:
+            for callback in self._status_listeners:
+                try:
+                    callback(device_id, connected)
+                except Exception as e:
+                    logger.error(f"EthernetIP status listener failed: {str(e)}")
+    
     def connect_device(self, config):
         """Establish connection to a device and keep it active"""
         try:
@@ -278,28 +298,16 @@ class EthernetIPService:
                 ret = comm.GetPLCTime()
                 
                 if ret.Status == 'Success':
-                    self._connection_status[config.id] = {
-                        'connected': True,
-                        'last_check': datetime.utcnow(),
-                        'message': f'Connected to {config.ip_address}'
-                    }
+                    self._set_status(config.id, True, f'Connected to {config.ip_address}')
                     logger.info(f"Connected to EthernetIP device {config.name} at {config.ip_address}")
                     return True, f"Connected successfully"
                 else:
-                    self._connection_status[config.id] = {
-                        'connected': False,
-                        'last_check': datetime.utcnow(),
-                        'message': f'Connection failed: {ret.Status}'
-                    }
+                    self._set_status(config.id, False, f'Connection failed: {ret.Status}')
                     logger.debug(f"EthernetIP connection failed for {config.name}: {ret.Status}")
                     return False, ret.Status
         except Exception as e:
             logger.debug(f"Failed to connect to EthernetIP device {config.name}: {str(e)}")
-            self._connection_status[config.id] = {
-                'connected': False,
-                'last_check': datetime.utcnow(),
-                'message': str(e)
-            }
+            self._set_status(config.id, False, str(e))
             return False, str(e)
     
     def discover_tags(self, config):
@@ -354,27 +362,15 @@ class EthernetIPService:
                 ret = comm.GetPLCTime()
                 
                 if ret.Status == 'Success':
-                    self._connection_status = {
-                        'connected': True,
-                        'last_check': datetime.utcnow(),
-                        'message': f'Connected to {config.ip_address}'
-                    }
+                    self._set_status(config.id, True, f'Connected to {config.ip_address}')
                     return True, f"Connection successful"
                 else:
-                    self._connection_status = {
-                        'connected': False,
-                        'last_check': datetime.utcnow(),
-                        'message': f'Connection failed: {ret.Status}'
-                    }
+                    self._set_status(config.id, False, f'Connection failed: {ret.Status}')
                     return False, ret.Status
                     
         except Exception as e:
             logger.error(f"EthernetIP connection test failed: {str(e)}")
-            self._connection_status = {
-                'connected': False,
-                'last_check': datetime.utcnow(),
-                'message': str(e)
-            }
+            self._set_status(config.id, False, str(e))
             return False, str(e)
     
     def read_tag(self, tag):
@@ -395,6 +391,37 @@ class EthernetIPService:
             logger.error(f"Tag read failed: {str(e)}")
             return False, str(e)
     
+    def read_tags(self, config, tag_names):
+        """Read several tags from one PLC in a single request.
+        
+        Returns one (success, value) tuple per tag name, in the same order.
+        pylogix packs a list Read into CIP Multiple Service Packets; the CPPPO
+        and mock clients read one tag per call, so they loop over one client.
+        """
+        tag_names = list(tag_names)
+        if not tag_names:
+            return []
+        
+        try:
+            with self._get_plc_client() as comm:
+                comm.IPAddress = config.ip_address
+                comm.ProcessorSlot = config.slot
+                comm.SocketTimeout = config.timeout
+                
+                if USE_MOCK_PLC or USE_CPPPO_CLIENT:
+                    responses = [comm.Read(tag_name) for tag_name in tag_names]
+                else:
+                    responses = comm.Read(tag_names)
+                
+                return [
+                    (True, ret.Value) if ret.Status == 'Success' else (False, ret.Status)
+                    for ret in responses
+                ]
+                    
+        except Exception as e:
+            logger.error(f"Tag batch read failed: {str(e)}")
+            return [(False, str(e))] * len(tag_names)
+    
     def write_tag(self, tag, value):
         try:
             with self._get_plc_client() as comm:
@@ -1,123 +1,177 @@
 import logging
 from datetime import datetime
 import json
+import hashlib
 import threading
+import time
+from types import MappingProxyType
+
+try:
+    import orjson
+except ImportError:  # optional - falls back to the stdlib encoder
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
+# Retries when paho's outgoing queue is full, backing off PUBLISH_QUEUE_BACKOFF * attempt seconds
+PUBLISH_QUEUE_RETRIES = 3
+PUBLISH_QUEUE_BACKOFF = 0.05
+
+# Payload types published as JSON
+_JSON_TYPES = (dict, list, tuple)
+
+
+def _json_dumps(value):
+    """Serialize value to JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value).encode()
+
+
+def _encode_payload(value):
+    """Encode a publish value straight to bytes.
+    
+    Exact type checks keep bool and subclasses on the str() path.
+    """
+    t = type(value)
+    if t is bytes:
+        return value
+    if t is int:
+        return b'%d' % value
+    if t is float:
+        return b'%r' % value
+    if t is str:
+        return value.encode()
+    if isinstance(value, _JSON_TYPES):
+        return _json_dumps(value)
+    return str(value).encode()
+
+
+def _json_loads(data):
+    """Parse JSON from bytes or str"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
 class MQTTService:
     def __init__(self):
-        self._connection_status = {}  # Dict to store status per config ID
-        self._clients = {}  # Active MQTT clients: {config_id: client}
+        self._connection_status = {}  # Dict to store status per config ID (replaced, never mutated)
+        self._status_view = MappingProxyType(self._connection_status)  # Lock-free read-only snapshot
+        self._clients = {}  # Shared MQTT publisher clients: {broker_key: client}
+        self._refs = {}  # Number of configs using each shared client: {broker_key: count}
+        self._client_keys = {}  # Broker key each config publishes through: {config_id: broker_key}
+        self._subscribers = {}  # Active MQTT subscribers: {config_id: client}
+        self._snmp_by_hwid = None  # SNMP configs for subscriber writes: {hwid: SNMPConfig}, None when stale
+        self._snmp_map_generation = 0
+        self._snmp_listeners_registered = False
+        self._status_listeners = []  # callback(config_id, connected) on connected-flag changes
         self._lock = threading.Lock()
     
     def cleanup(self):
         """Cleanup all persistent MQTT connections"""
         with self._lock:
-            # Cleanup publishers
-            for config_id, client in self._clients.items():
-                try:
-                    client.loop_stop()
-                    client.disconnect()
-                    logger.info(f"Closed MQTT client for config {config_id}")
-                except Exception as e:
-                    logger.error(f"Error closing MQTT client {config_id}: {str(e)}")
+            clients = dict(self._clients)
             self._clients.clear()
-            
-            # Cleanup subscribers
-            if hasattr(self, '_subscribers'):
-                for config_id, client in self._subscribers.items():
-                    try:
-                        client.loop_stop()
-                        client.disconnect()
-                        logger.info(f"Closed MQTT subscriber for config {config_id}")
-                    except Exception as e:
-                        logger.error(f"Error closing MQTT subscriber {config_id}: {str(e)}")
-                self._subscribers.clear()
+            self._refs.clear()
+            self._client_keys.clear()
+        
+        # Cleanup publishers outside the lock - disconnect callbacks take it
+        for key, client in clients.items():
+            try:
+                client.loop_stop()
+                client.disconnect()
+                logger.info(f"Closed MQTT client for {key[0]}:{key[1]}")
+            except Exception as e:
+                logger.error(f"Error closing MQTT client {key[0]}:{key[1]}: {str(e)}")
+        
+        with self._lock:
+            subscribers = dict(self._subscribers)
+            self._subscribers.clear()
+        
+        # Cleanup subscribers
+        for config_id, client in subscribers.items():
+            try:
+                client.loop_stop()
+                client.disconnect()
+                logger.info(f"Closed MQTT subscriber for config {config_id}")
+            except Exception as e:
+                logger.error(f"Error closing MQTT subscriber {config_id}: {str(e)}")
     
     def get_connection_status(self, config_id=None):
         """Get connection status for specific config or all configs"""
-        with self._lock:
-            if config_id:
-                return self._connection_status.get(config_id, {
-                    'connected': False,
-                    'last_check': None,
-                    'message': 'Not connected'
-                })
-            return self._connection_status
+        # Writers swap in a new snapshot under the lock, so a single attribute read is consistent
+        status_view = self._status_view
+        if config_id:
+            return status_view.get(config_id, {
+                'connected': False,
+                'last_check': None,
+                'message': 'Not connected'
+            })
+        return status_view
+    
+    def add_status_listener(self, callback):
+        """Register callback(config_id, connected), called whenever a broker's connected flag changes.
+        
+        Callbacks run with the service lock held and must not call back into the service.
+        """
+        self._status_listeners.append(callback)
+    
+    def _update_status(self, updates):
+        """Copy-on-write status update (caller holds lock): {config_id: status}"""
+        if not updates:
+            return
+        old_status = self._connection_status
+        new_status = dict(old_status)
+        new_status.update(updates)
+        self._connection_status = new_status
+        self._status_view = MappingProxyType(new_status)
+        
+        for config_id, status in updates.items():
+            previous = old_status.get(config_id)
+            connected = status.get('connected', False)
+            if previous is None or previous.get('connected') != connected:
+                for callback in self._status_listeners:
+                    try:
+                        callback(config_id, connected)
+                    except Exception as e:
+                        logger.error(f"MQTT status listener failed: {str(e)}")
     
     def connect_broker(self, config):
-        """Establish connection to MQTT broker"""
+        """Connect the config's persistent publisher client and wait briefly for the broker to accept it"""
         try:
-            import paho.mqtt.client as mqtt
-            
-            result = {'connected': False, 'message': ''}
-            
-            def on_connect(client, userdata, flags, rc, properties=None):
-                if rc == 0:
-                    result['connected'] = True
-                    result['message'] = 'Connected successfully'
-                else:
-                    result['message'] = f'Connection failed with code {rc}'
-            
-            # Create client with version compatibility
-            try:
-                client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
-            except AttributeError:
-                client = mqtt.Client()
-            
-            client.on_connect = on_connect
-            
-            if config.username and config.password:
-                client.username_pw_set(config.username, config.password)
-            
-            if config.use_tls:
-                client.tls_set()
+            client, stale = self._get_client(config)
+            if stale is not None:
+                self._close_client(stale)
+            
+            # The client's network thread completes the handshake; wait for it
+            timeout = 5
+            start = time.monotonic()
+            while not client.is_connected() and time.monotonic() - start < timeout:
+                time.sleep(0.1)
+            
+            connected = client.is_connected()
+            message = 'Connected successfully' if connected else 'Connection timed out'
+            with self._lock:
+                self._update_status({config.id: {
+                    'connected': connected,
+                    'last_check': datetime.utcnow(),
+                    'message': message
+                }})
             
-            try:
-                client.connect(config.broker, config.port, 60)
-                client.loop_start()
-                
-                import time
-                timeout = 5
-                start = time.time()
-                while not result['connected'] and time.time() - start < timeout:
-                    time.sleep(0.1)
-                
-                client.loop_stop()
-                client.disconnect()
-                
-                with self._lock:
-                    self._connection_status[config.id] = {
-                        'connected': result['connected'],
-                        'last_check': datetime.utcnow(),
-                        'message': result['message']
-                    }
-                
-                if result['connected']:
-                    logger.info(f"Connected to MQTT broker {config.name} at {config.broker}")
-                    return True, result['message']
-                else:
-                    return False, result['message']
-                    
-            except Exception as e:
-                logger.error(f"MQTT connection error: {str(e)}")
-                with self._lock:
-                    self._connection_status[config.id] = {
-                        'connected': False,
-                        'last_check': datetime.utcnow(),
-                        'message': str(e)
-                    }
-                return False, str(e)
+            if connected:
+                logger.info(f"Connected to MQTT broker {config.name} at {config.broker}")
+                return True, message
+            return False, message
                 
         except Exception as e:
             logger.error(f"MQTT connection failed: {str(e)}")
             with self._lock:
-                self._connection_status[config.id] = {
+                self._update_status({config.id: {
                     'connected': False,
                     'last_check': datetime.utcnow(),
                     'message': str(e)
-                }
+                }})
             return False, str(e)
     
     def test_connection(self, config):
@@ -153,7 +207,6 @@ class MQTTService:
                 client.connect(config.broker, config.port, 60)
                 client.loop_start()
                 
-                import time
                 timeout = 5
                 start = time.time()
                 while not result['connected'] and time.time() - start < timeout:
@@ -163,98 +216,304 @@ class MQTTService:
                 client.disconnect()
                 
                 if result['connected']:
-                    self._connection_status = {
-                        'connected': True,
-                        'last_check': datetime.utcnow(),
-                        'message': f'Connected to {config.broker}'
-                    }
+                    with self._lock:
+                        self._update_status({config.id: {
+                            'connected': True,
+                            'last_check': datetime.utcnow(),
+                            'message': f'Connected to {config.broker}'
+                        }})
                     return True, result['message']
                 else:
                     if not result['message']:
                         result['message'] = 'Connection timeout'
-                    self._connection_status = {
-                        'connected': False,
-                        'last_check': datetime.utcnow(),
-                        'message': result['message']
-                    }
+                    with self._lock:
+                        self._update_status({config.id: {
+                            'connected': False,
+                            'last_check': datetime.utcnow(),
+                            'message': result['message']
+                        }})
                     return False, result['message']
                     
             except Exception as e:
-                self._connection_status = {
-                    'connected': False,
-                    'last_check': datetime.utcnow(),
-                    'message': str(e)
-                }
+                with self._lock:
+                    self._update_status({config.id: {
+                        'connected': False,
+                        'last_check': datetime.utcnow(),
+                        'message': str(e)
+                    }})
                 return False, str(e)
                 
         except Exception as e:
             logger.error(f"MQTT connection test failed: {str(e)}")
-            self._connection_status = {
-                'connected': False,
-                'last_check': datetime.utcnow(),
-                'message': str(e)
-            }
+            with self._lock:
+                self._update_status({config.id: {
+                    'connected': False,
+                    'last_check': datetime.utcnow(),
+                    'message': str(e)
+                }})
             return False, str(e)
     
-    def publish(self, config, topic, value):
-        """Publish to MQTT using persistent connection"""
+    @staticmethod
+    def _client_key(config):
+        """Broker endpoint key - configs with the same key share one publisher client"""
+        return (config.broker, int(config.port), config.username or '', bool(config.use_tls))
+    
+    def _create_client(self, config, key):
+        """Create and connect a persistent publisher client for a broker endpoint"""
+        import paho.mqtt.client as mqtt
+        
+        # Stable client ID + persistent session so the broker resumes it on reconnect. The ID comes
+        # from the broker key, not the config that happened to create the client, so two live
+        # shared clients can never claim the same ID and take over each other's session.
+        key_hash = hashlib.sha1(repr(key).encode()).hexdigest()[:12]
+        client_id = f"snmp_bridge_pub_{key_hash}"
         try:
-            import paho.mqtt.client as mqtt
-            
+            client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=client_id, clean_session=False)
+        except AttributeError:
+            client = mqtt.Client(client_id=client_id, clean_session=False)
+        
+        def on_connect(client, userdata, flags, rc, properties=None):
+            if rc == 0:
+                self._set_shared_status(key, True, f'Connected to {config.broker}')
+            else:
+                self._set_shared_status(key, False, f'Connection failed with code {rc}')
+        
+        def on_disconnect(client, userdata, flags, rc=None, properties=None):
+            self._set_shared_status(key, False, 'Disconnected')
+        
+        client.on_connect = on_connect
+        client.on_disconnect = on_disconnect
+        
+        if config.username and config.password:
+            client.username_pw_set(config.username, config.password)
+        
+        if config.use_tls:
+            client.tls_set()
+        
+        # The network thread reconnects on its own after a drop, backing off 1s..30s
+        client.reconnect_delay_set(min_delay=1, max_delay=30)
+        client.connect(config.broker, config.port, 60)
+        client.loop_start()
+        return client
+    
+    def _set_shared_status(self, key, connected, message):
+        """Propagate a shared client's state to every config publishing through it"""
+        status = {
+            'connected': connected,
+            'last_check': datetime.utcnow(),
+            'message': message
+        }
+        with self._lock:
+            self._update_status({
+                config_id: status
+                for config_id, client_key in self._client_keys.items() if client_key == key
+            })
+    
+    def _get_client(self, config):
+        """Get the shared publisher client for a config, creating it if needed.
+        
+        Takes self._lock itself; a new client connects outside it, so an unreachable broker
+        does not stall status callbacks and publishes on other brokers. Returns (client, stale)
+        where stale is a client released because the config moved to another broker endpoint;
+        the caller must close it.
+        """
+        key = self._client_key(config)
+        created = None
+        installed = False
+        while True:
             with self._lock:
-                # Get or create persistent client for this broker
-                if config.id not in self._clients:
-                    # Create new persistent client
-                    try:
-                        client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
-                    except AttributeError:
-                        client = mqtt.Client()
-                    
-                    if config.username and config.password:
-                        client.username_pw_set(config.username, config.password)
-                    
-                    if config.use_tls:
-                        client.tls_set()
-                    
-                    try:
-                        client.connect(config.broker, config.port, 60)
-                        client.loop_start()
-                        self._clients[config.id] = client
-                        logger.debug(f"Created persistent MQTT client for {config.name}")
-                    except Exception as e:
-                        logger.error(f"Failed to create MQTT client for {config.name}: {str(e)}")
-                        return False, str(e)
+                if self._client_keys.get(config.id) == key:
+                    if key in self._clients:
+                        client, stale = self._clients[key], None  # Possibly set up by a concurrent call
+                        break
+                    del self._client_keys[config.id]  # Its client is already gone
                 
-                client = self._clients[config.id]
-            
-            # Topic is already formatted with prefix from polling service
-            full_topic = topic
-            
-            if isinstance(value, (dict, list)):
-                payload = json.dumps(value)
-            else:
-                payload = str(value)
-            
-            # Publish using persistent connection
-            result = client.publish(full_topic, payload)
-            
-            # Don't wait for publish to avoid blocking
-            # result.wait_for_publish()
-            
-            return True, f"Published to {full_topic}"
-            
+                client = self._clients.get(key)
+                if client is None and created is not None:
+                    client, created = created, None
+                    self._clients[key] = client
+                    self._refs[key] = 0
+                    installed = True
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug("Created persistent MQTT client for %s", config.name)
+                
+                if client is not None:
+                    stale = self._unref_client(config.id)
+                    self._refs[key] += 1
+                    self._client_keys[config.id] = key
+                    break
+            
+            # Connect before releasing the old client: if this raises, the config keeps its
+            # current client and nothing is left unclosed
+            created = self._create_client(config, key)
+        
+        if created is not None:
+            # Another thread connected a client for this key first; use theirs. Detach the
+            # callbacks so closing ours does not mark the shared configs disconnected.
+            created.on_connect = None
+            created.on_disconnect = None
+            self._close_client(created)
+        elif installed and client.is_connected():
+            # on_connect may have fired before the config was registered under this key
+            self._set_shared_status(key, True, f'Connected to {config.broker}')
+        return client, stale
+    
+    def _unref_client(self, config_id):
+        """Drop a config's reference to its shared client (caller holds lock).
+        
+        Returns the client if this was the last reference and it must be closed.
+        """
+        key = self._client_keys.pop(config_id, None)
+        if key is None or key not in self._refs:
+            return None
+        
+        self._refs[key] -= 1
+        if self._refs[key] > 0:
+            return None
+        
+        del self._refs[key]
+        return self._clients.pop(key, None)
+    
+    @staticmethod
+    def _close_client(client):
+        try:
+            client.loop_stop()
+            client.disconnect()
+        except Exception:
+            pass
+    
+    def release_client(self, config_id):
+        """Release a config's publisher client, disconnecting it when no other config uses it"""
+        with self._lock:
+            client = self._unref_client(config_id)
+        if client is not None:
+            self._close_client(client)
+            logger.info(f"Closed MQTT client for config {config_id}")
+    
+    def publish(self, config, topic, value):
+        """Publish to MQTT using persistent connection"""
+        # Topic is already formatted with prefix from polling service
+        published, error = self._publish_batch(config, [(topic, value, 0)])
+        if error:
+            return False, error
+        return True, f"Published to {topic}"
+    
+    def publish_many(self, config, messages):
+        """Publish a batch of (topic, value, qos) messages through one client lookup"""
+        published, error = self._publish_batch(config, messages)
+        if error:
+            return False, f"Published {published}/{len(messages)} messages: {error}"
+        return True, f"Published {published} messages"
+    
+    def _publish_batch(self, config, messages):
+        """Publish messages on the shared client for config.
+        
+        Returns (published_count, error); error is None when every message was queued.
+        Stops at the first not-connected failure.
+        """
+        import paho.mqtt.client as mqtt
+        
+        # Get or create the shared persistent client for this broker
+        try:
+            client, stale = self._get_client(config)
         except Exception as e:
-            logger.error(f"MQTT publish failed: {str(e)}")
-            # Remove failed client so it will be recreated
+            logger.error(f"Failed to create MQTT client for {config.name}: {str(e)}")
+            return 0, str(e)
+        
+        if stale is not None:
+            self._close_client(stale)
+        
+        published = 0
+        error = None
+        for topic, value, qos in messages:
+            try:
+                payload = _encode_payload(value)
+                
+                # Publish using persistent connection - don't wait for delivery to avoid blocking
+                result = client.publish(topic, payload, qos)
+                
+                # A full outgoing queue is transient: back off briefly rather than rebuilding the client
+                for attempt in range(1, PUBLISH_QUEUE_RETRIES + 1):
+                    if result.rc != mqtt.MQTT_ERR_QUEUE_SIZE:
+                        break
+                    time.sleep(PUBLISH_QUEUE_BACKOFF * attempt)
+                    result = client.publish(topic, payload, qos)
+            except (ValueError, TypeError) as e:
+                # Invalid topic or unserializable payload - the client itself is fine
+                logger.error(f"MQTT publish failed: {str(e)}")
+                error = str(e)
+                continue
+            
+            if result.rc == mqtt.MQTT_ERR_SUCCESS:
+                published += 1
+                continue
+            
+            error = mqtt.error_string(result.rc)
+            logger.error(f"MQTT publish failed: {error}")
+            
+            # Not connected right now: the client's network thread is already reconnecting on its
+            # own (reconnect_delay_set), so keep it and let the rest of the batch wait for the next flush
+            if result.rc in (mqtt.MQTT_ERR_NO_CONN, mqtt.MQTT_ERR_CONN_LOST):
+                break
+        
+        return published, error
+    
+    def _register_snmp_listeners(self):
+        """Invalidate the HWID map once a change to an SNMP config row is committed"""
+        from sqlalchemy import event
+        from sqlalchemy.orm import Session
+        from models import SNMPConfig
+        
+        with self._lock:
+            if self._snmp_listeners_registered:
+                return
+            # Mapper events fire at flush, before other sessions can see the change, so they only
+            # flag the session; the map is dropped when it commits
+            for event_name in ('after_insert', 'after_update', 'after_delete'):
+                event.listen(SNMPConfig, event_name, self._note_snmp_change)
+            event.listen(Session, 'after_commit', self._apply_snmp_change)
+            event.listen(Session, 'after_rollback', self._discard_snmp_change)
+            self._snmp_listeners_registered = True
+    
+    def _note_snmp_change(self, mapper, connection, target):
+        from sqlalchemy.orm import object_session
+        
+        session = object_session(target)
+        if session is None:
+            self._invalidate_snmp_map()
+        else:
+            session.info['snmp_config_changed'] = True
+    
+    def _apply_snmp_change(self, session):
+        if session.info.pop('snmp_config_changed', False):
+            self._invalidate_snmp_map()
+    
+    def _discard_snmp_change(self, session):
+        session.info.pop('snmp_config_changed', None)
+    
+    def _invalidate_snmp_map(self):
+        with self._lock:
+            # Bumped so a reload that read the old rows does not store them after this
+            self._snmp_map_generation += 1
+            self._snmp_by_hwid = None
+    
+    def _get_snmp_map(self, app_ref):
+        """Get the HWID -> SNMPConfig map, reloading it from the database when stale"""
+        snmp_by_hwid = self._snmp_by_hwid
+        if snmp_by_hwid is None:
+            from models import SNMPConfig
+            
+            generation = self._snmp_map_generation
+            # Separate app context so the rows live in their own session and stay
+            # readable (detached) once it is torn down
+            with app_ref.app_context():
+                configs = SNMPConfig.query.order_by(SNMPConfig.id.desc()).all()
+                snmp_by_hwid = {c.hwid: c for c in configs if c.hwid}
             with self._lock:
-                if config.id in self._clients:
-                    try:
-                        self._clients[config.id].loop_stop()
-                        self._clients[config.id].disconnect()
-                    except:
-                        pass
-                    del self._clients[config.id]
-            return False, str(e)
+                if generation == self._snmp_map_generation:
+                    self._snmp_by_hwid = snmp_by_hwid
+            logger.debug(f"Loaded {len(snmp_by_hwid)} SNMP configs into HWID map")
+        return snmp_by_hwid
     
     def start_subscriber(self, config, flask_app=None):
         """Start MQTT subscriber for two-way communication"""
@@ -275,29 +534,37 @@ class MQTTService:
                     logger.error("Flask app context not available and no app passed")
                     return False, "Flask app context not available"
             
+            # Preload the HWID -> SNMP config map used by incoming write commands
+            self._register_snmp_listeners()
+            self._get_snmp_map(app_ref)
+            
             def on_connect(client, userdata, flags, rc, properties=None):
                 if rc == 0:
                     client.subscribe(config.subscribe_topic+"/#")  # Subscribe to all subtopics
                     logger.info(f"Subscribed to topic '{config.subscribe_topic}' for config {config.name}")
                     with self._lock:
-                        self._connection_status[config.id] = {
+                        self._update_status({config.id: {
                             'connected': True,
                             'last_check': datetime.utcnow(),
                             'message': f'Subscribed to {config.subscribe_topic}'
-                        }
+                        }})
                 else:
                     logger.error(f"MQTT subscriber connection failed with code {rc}")
             
+            # Reply topics are invariant for this subscriber - build them once
+            confirm_topic = (config.publish_topic + "/confirmation") if config.publish_topic else None
+            error_topic = (config.publish_topic + "/error") if config.publish_topic else None
+            
             def on_message(client, userdata, msg):
                 """Handle incoming MQTT messages for SNMP write operations"""
                 try:
-                    payload = msg.payload.decode('utf-8')
-                    logger.debug(f"Received MQTT message on {msg.topic}: {payload}")
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug("Received MQTT message on %s: %s", msg.topic, msg.payload.decode('utf-8', 'replace'))
                     
-                    # Parse JSON message
+                    # Parse JSON message straight from the payload bytes (decoded during parsing)
                     try:
-                        data = json.loads(payload)
-                    except json.JSONDecodeError as e:
+                        data = _json_loads(msg.payload)
+                    except ValueError as e:
                         logger.error(f"Invalid JSON in MQTT message: {str(e)}")
                         return
                     
@@ -326,57 +593,53 @@ class MQTTService:
                     
                     logger.info(f"Processing SNMP write command: device_id={device_id}, topic_hwid={topic_hwid}, parameter={parameter_name}, value={value}, msg_id={message_id}")
                     
-                    # Get Flask app instance and create application context
+                    # Find SNMP config by HWID (from topic or device_id)
+                    snmp_config = self._get_snmp_map(app_ref).get(str(hwid_to_search))
+                    if not snmp_config:
+                        logger.warning(f"No SNMP configuration found for HWID: {hwid_to_search}")
+                        return
+                    
+                    # Get SNMP service and perform write operation
+                    snmp_service = app_ref.config.get('snmp_service')
+                    if not snmp_service:
+                        logger.error("SNMP service not available")
+                        return
+                    
+                    # Write to SNMP device (needs app context for the database update)
                     with app_ref.app_context():
-                        # Find SNMP config by HWID (from topic or device_id)
-                        from models import SNMPConfig
-                        from database import db
-                        
-                        snmp_config = db.session.query(SNMPConfig).filter_by(hwid=hwid_to_search).first()
-                        if not snmp_config:
-                            logger.warning(f"No SNMP configuration found for HWID: {hwid_to_search}")
-                            return
-                        
-                        # Get SNMP service and perform write operation
-                        snmp_service = app_ref.config.get('snmp_service')
-                        if not snmp_service:
-                            logger.error("SNMP service not available")
-                            return
-                        
-                        # Write to SNMP device
                         success, message = snmp_service.write_by_name(snmp_config, parameter_name, value)
-                        
-                        if success:
-                            logger.info(f"Successfully wrote '{value}' to '{parameter_name}' on device {hwid_to_search}")
-                            # Optionally publish confirmation message
-                            if config.publish_topic:
-                                confirmation = {
-                                    "device_id": device_id,
-                                    "hwid": hwid_to_search,
-                                    "topic": msg.topic,
-                                    "Parameter_Name": parameter_name,
-                                    "value": value,
-                                    "message_id": message_id,
-                                    "status": "success",
-                                    "timestamp": datetime.utcnow().isoformat()
-                                }
-                                client.publish(f"{config.publish_topic}/confirmation", json.dumps(confirmation))
-                        else:
-                            logger.error(f"Failed to write '{value}' to '{parameter_name}' on device {hwid_to_search}: {message}")
-                            # Publish error message
-                            if config.publish_topic:
-                                error_msg = {
-                                    "device_id": device_id,
-                                    "hwid": hwid_to_search,
-                                    "topic": msg.topic,
-                                    "Parameter_Name": parameter_name,
-                                    "value": value,
-                                    "message_id": message_id,
-                                    "status": "error",
-                                    "error": message,
-                                    "timestamp": datetime.utcnow().isoformat()
-                                }
-                                client.publish(f"{config.publish_topic}/error", json.dumps(error_msg))
+                    
+                    if success:
+                        logger.info(f"Successfully wrote '{value}' to '{parameter_name}' on device {hwid_to_search}")
+                        # Optionally publish confirmation message
+                        if confirm_topic is not None:
+                            confirmation = {
+                                "device_id": device_id,
+                                "hwid": hwid_to_search,
+                                "topic": msg.topic,
+                                "Parameter_Name": parameter_name,
+                                "value": value,
+                                "message_id": message_id,
+                                "status": "success",
+                                "timestamp": datetime.utcnow().isoformat()
+                            }
+                            client.publish(confirm_topic, json.dumps(confirmation))
+                    else:
+                        logger.error(f"Failed to write '{value}' to '{parameter_name}' on device {hwid_to_search}: {message}")
+                        # Publish error message
+                        if error_topic is not None:
+                            error_msg = {
+                                "device_id": device_id,
+                                "hwid": hwid_to_search,
+                                "topic": msg.topic,
+                                "Parameter_Name": parameter_name,
+                                "value": value,
+                                "message_id": message_id,
+                                "status": "error",
+                                "error": message,
+                                "timestamp": datetime.utcnow().isoformat()
+                            }
+                            client.publish(error_topic, json.dumps(error_msg))
                     
                 except Exception as e:
                     logger.error(f"Error processing MQTT message: {str(e)}", exc_info=True)
@@ -385,15 +648,19 @@ class MQTTService:
                 if rc != 0:
                     logger.warning(f"MQTT subscriber unexpectedly disconnected with code {rc}")
                     with self._lock:
-                        if config.id in self._connection_status:
-                            self._connection_status[config.id]['connected'] = False
-                            self._connection_status[config.id]['message'] = f'Disconnected (code {rc})'
+                        status = self._connection_status.get(config.id)
+                        if status is not None:
+                            self._update_status({config.id: {
+                                **status,
+                                'connected': False,
+                                'message': f'Disconnected (code {rc})'
+                            }})
                 
             # Create subscriber client
             try:
-                subscriber_client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=f"snmp_bridge_sub_{config.id}")
+                subscriber_client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=f"snmp_bridge_sub_{config.id}", clean_session=False)
             except AttributeError:
-                subscriber_client = mqtt.Client(client_id=f"snmp_bridge_sub_{config.id}")
+                subscriber_client = mqtt.Client(client_id=f"snmp_bridge_sub_{config.id}", clean_session=False)
                 
             subscriber_client.on_connect = on_connect
             subscriber_client.on_message = on_message
@@ -411,8 +678,6 @@ class MQTTService:
             
             # Store subscriber client separately
             with self._lock:
-                if not hasattr(self, '_subscribers'):
-                    self._subscribers = {}
                 self._subscribers[config.id] = subscriber_client
             
             logger.info(f"Started MQTT subscriber for {config.name} on topic '{config.subscribe_topic}'")
@@ -426,15 +691,16 @@ class MQTTService:
         """Stop MQTT subscriber for a configuration"""
         try:
             with self._lock:
-                if hasattr(self, '_subscribers') and config_id in self._subscribers:
-                    client = self._subscribers[config_id]
-                    client.loop_stop()
-                    client.disconnect()
-                    del self._subscribers[config_id]
-                    logger.info(f"Stopped MQTT subscriber for config {config_id}")
-                    return True, "Subscriber stopped"
-                else:
-                    return True, "No active subscriber found"
+                client = self._subscribers.pop(config_id, None)
+            
+            if client is None:
+                return True, "No active subscriber found"
+            
+            # Disconnect outside the lock - the subscriber's disconnect callback takes it
+            client.loop_stop()
+            client.disconnect()
+            logger.info(f"Stopped MQTT subscriber for config {config_id}")
+            return True, "Subscriber stopped"
         except Exception as e:
             logger.error(f"Error stopping subscriber: {str(e)}")
             return False, str(e)
@@ -4,14 +4,23 @@ Continuously reads EthernetIP tags and SNMP objects, publishes to MQTT
 Uses asyncio and concurrent threading for parallel device polling
 """
 import asyncio
+import heapq
 import threading
 import time
 import logging
+import queue
 from datetime import datetime
 from flask import Flask
 import json
+from collections import deque
 from concurrent.futures import ThreadPoolExecutor
 from functools import partial
+from sqlalchemy.orm import sessionmaker
+
+try:
+    import orjson
+except ImportError:  # optional - falls back to the stdlib encoder
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
@@ -25,23 +34,64 @@ class PollingService:
         self.data_logging_service = data_logging_service
         
         # Threading infrastructure
-        self._eip_thread = None
-        self._snmp_thread = None
+        self._scheduler_thread = None
         self._reconnect_thread = None
+        self._flush_thread = None
+        self._log_writer_thread = None
         self._stop_event = threading.Event()
         self._running = False
         
-        # Thread pools for parallel device polling
-        self._eip_executor = ThreadPoolExecutor(max_workers=5, thread_name_prefix="EIP-Worker")
-        self._snmp_executor = ThreadPoolExecutor(max_workers=5, thread_name_prefix="SNMP-Worker")
+        # Thread pools for parallel device polling. Workers mostly wait on device I/O,
+        # so the pools are sized well above the CPU count.
+        self._max_workers = 32
+        self._eip_executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="EIP-Worker")
+        self._snmp_executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="SNMP-Worker")
+        
+        # Poll schedule across both protocols, owned by the scheduler thread
+        self._schedule = []  # heap of (next_due_ns, kind, device_id) with kind in 'eip', 'snmp'
+        self._scheduled = {}  # (kind, device_id) -> (next_due_ns, polling_interval_ms) of its live heap entry
+        self._in_flight = set()  # (kind, device_id) submitted and not yet finished
+        self._wake_event = threading.Event()  # Wakes the scheduler early (config change, stop)
         
-        # Tracking dictionaries (thread-safe with locks)
-        self._last_poll_time = {}  # Track last poll time per device
+        # Tracking dictionaries
+        # Timestamps are time.monotonic_ns() ints: cheap to read and immune to wall-clock jumps
         self._last_reconnect_attempt = {}  # Track last reconnection attempt
-        self._reconnect_interval = 10  # Reconnect check interval in seconds
+        self._reconnect_interval = 10  # Minimum seconds between reconnect attempts per device
+        self._reconnect_sweep_interval = 60  # Full offline-device sweep interval in seconds
+        self._reconnect_queue = queue.Queue()  # (kind, device_id) reported offline; None stops the thread
         self._last_log_time = {}  # Track last log time per device
-        self._log_interval = 30  # Log detailed info every 30 seconds
-        self._lock = threading.Lock()  # Thread safety for shared data
+        self._log_interval_ns = 30 * 1_000_000_000  # Log detailed info every 30 seconds
+        
+        # Delta publishing: last published values per device ("eip_<id>" / "snmp_<id>")
+        self._last_published = {}  # {device_key: (keyframe_ns, {name: value})}
+        self._keyframe_interval_ns = 30 * 1_000_000_000  # Publish every value at least every 30 seconds
+        
+        # Outbound MQTT messages per broker, published in batches by the flusher thread
+        self._publish_queues = {}  # {mqtt_config_id: (mqtt_config, deque of (topic, payload, qos))}
+        self._publish_queue_lock = threading.Lock()
+        self._flush_interval = 0.05  # Seconds between batch flushes
+        
+        # Data log rows, inserted in batches by the log writer thread
+        self._log_queue = queue.SimpleQueue()
+        self._log_batch_size = 500  # Max rows per insert transaction
+        
+        # Connected flag per device/broker ("eip_<id>", "snmp_<id>", "mqtt_<id>"), kept current
+        # by the services' status listeners so the poll workers skip offline devices cheaply
+        # and the reconnect thread only wakes when something drops
+        self._connected = {}
+        for kind, service in (('eip', ethernetip_service), ('snmp', snmp_service), ('mqtt', mqtt_service)):
+            if service:
+                for device_id, status in list(service.get_connection_status().items()):
+                    self._connected[f"{kind}_{device_id}"] = status.get('connected', False)
+                service.add_status_listener(partial(self._on_status_change, kind))
+        
+        # Sessions for worker threads, independent of Flask-SQLAlchemy's scoped session.
+        # Built while the caller's app context is active, since db.engine needs one.
+        self._session_factory = sessionmaker(bind=db.engine, expire_on_commit=False)
+        
+        # Enabled device/broker configs, reloaded at most every _config_cache_ttl seconds
+        self._config_cache = {}  # {kind: (loaded_at, rows)} with kind in 'eip', 'snmp', 'mqtt'
+        self._config_cache_ttl = 5.0
         
         logger.info("Polling Service initialized with parallel threading")
         print("=== Polling Service Initialized (Multi-threaded) ===")
@@ -55,16 +105,21 @@ class PollingService:
         self._stop_event.clear()
         self._running = True
         
-        # Start separate threads for each protocol
-        self._eip_thread = threading.Thread(target=self._ethernetip_loop, daemon=True, name="EIP-Main")
-        self._snmp_thread = threading.Thread(target=self._snmp_loop, daemon=True, name="SNMP-Main")
+        # Drop a stop sentinel left over from a previous stop()
+        self._reconnect_queue = queue.Queue()
+        
+        # Start the scheduler and its helper threads
+        self._scheduler_thread = threading.Thread(target=self._scheduler_loop, daemon=True, name="Poll-Scheduler")
         self._reconnect_thread = threading.Thread(target=self._reconnect_loop, daemon=True, name="Reconnect")
+        self._flush_thread = threading.Thread(target=self._flush_loop, daemon=True, name="MQTT-Flusher")
+        self._log_writer_thread = threading.Thread(target=self._log_writer_loop, daemon=True, name="Log-Writer")
         
-        self._eip_thread.start()
-        self._snmp_thread.start()
+        self._scheduler_thread.start()
         self._reconnect_thread.start()
+        self._flush_thread.start()
+        self._log_writer_thread.start()
         
-        logger.info("Polling service started - 3 main threads + 2 worker pools")
+        logger.info("Polling service started - 4 main threads + 2 worker pools")
     
     def stop(self):
         """Stop all background threads and cleanup"""
@@ -73,9 +128,11 @@ class PollingService:
         
         self._stop_event.set()
         self._running = False
+        self._reconnect_queue.put(None)  # Wake the reconnect thread
+        self._wake_event.set()  # Wake the scheduler
         
         # Wait for threads to finish
-        threads = [self._eip_thread, self._snmp_thread, self._reconnect_thread]
+        threads = [self._scheduler_thread, self._reconnect_thread, self._flush_thread, self._log_writer_thread]
         for thread in threads:
             if thread and thread.is_alive():
                 thread.join(timeout=5)
@@ -84,393 +141,473 @@ class PollingService:
         self._eip_executor.shutdown(wait=True, cancel_futures=True)
         self._snmp_executor.shutdown(wait=True, cancel_futures=True)
         
+        # Publish and log anything still queued
+        self._flush_publish_queues()
+        self._write_log_batches()
+        
         logger.info("Polling service stopped - all threads terminated")
         print("=== Polling Service Stopped ===")
     
-    def _ethernetip_loop(self):
-        """Main EthernetIP polling loop - runs in dedicated thread"""
-        logger.info("EthernetIP polling thread started")
+    def _scheduler_loop(self):
+        """Polling scheduler - runs in dedicated thread
+        
+        Keeps a heap of (next_due_ns, kind, device_id) across EthernetIP and
+        SNMP devices, submits each device to its protocol's pool when due, and
+        sleeps until the next one is due. A device still being polled is not
+        submitted again; its next slot is simply skipped. Heap entries that no
+        longer match _scheduled (superseded by an interval change) are dropped.
+        """
+        logger.info("Polling scheduler thread started")
         
         while not self._stop_event.is_set():
             try:
-                with self.app.app_context():
-                    from models import EthernetIPConfig, EthernetIPTag, MQTTConfig
-                    
-                    # Get all enabled devices
-                    configs = self.db.session.query(EthernetIPConfig).filter_by(enabled=True).all()
-                    
-                    if not configs:
-                        self._stop_event.wait(5.0)
-                        continue
-                    
-                    # Submit each device to thread pool for parallel polling
-                    futures = []
-                    for config in configs:
-                        future = self._eip_executor.submit(
-                            self._poll_single_ethernetip_device,
-                            config.id
-                        )
-                        futures.append(future)
-                    
-                    # Wait for all devices to complete (with timeout)
-                    for future in futures:
-                        try:
-                            future.result(timeout=10)
-                        except Exception as e:
-                            logger.error(f"EIP device polling error: {str(e)}")
+                from models import EthernetIPConfig, SNMPConfig
                 
-                # Short sleep between poll cycles
-                self._stop_event.wait(0.5)
+                configs = {
+                    'eip': {c.id: c for c in self._get_cached_configs('eip', EthernetIPConfig)} if self.eip_service else {},
+                    'snmp': {c.id: c for c in self._get_cached_configs('snmp', SNMPConfig)} if self.snmp_service else {}
+                }
                 
-            except Exception as e:
-                logger.error(f"Error in EthernetIP loop: {str(e)}", exc_info=True)
-                self._stop_event.wait(5.0)
-    
-    def _snmp_loop(self):
-        """Main SNMP polling loop - runs in dedicated thread"""
-        logger.info("SNMP polling thread started")
-        
-        while not self._stop_event.is_set():
-            try:
-                with self.app.app_context():
-                    from models import SNMPConfig, SNMPObject, MQTTConfig
+                # New devices are due immediately; removed ones are dropped as they come up.
+                # A changed interval takes effect now rather than after the old slot comes due.
+                now_ns = time.monotonic_ns()
+                for kind, by_id in configs.items():
+                    for device_id, config in by_id.items():
+                        polling_interval_ms = config.polling_interval or 1000
+                        entry = self._scheduled.get((kind, device_id))
+                        if entry is not None and entry[1] == polling_interval_ms:
+                            continue
+                        next_due_ns = now_ns if entry is None else min(entry[0], now_ns + polling_interval_ms * 1_000_000)
+                        self._scheduled[(kind, device_id)] = (next_due_ns, polling_interval_ms)
+                        if entry is None or next_due_ns != entry[0]:
+                            heapq.heappush(self._schedule, (next_due_ns, kind, device_id))
+                
+                brokers = None  # Resolved once per wake-up, only if something is due
+                while self._schedule and self._schedule[0][0] <= now_ns:
+                    due_ns, kind, device_id = heapq.heappop(self._schedule)
+                    entry = self._scheduled.get((kind, device_id))
+                    if entry is None or entry[0] != due_ns:
+                        continue  # Superseded slot
+                    config = configs[kind].get(device_id)
+                    if config is None:
+                        del self._scheduled[(kind, device_id)]
+                        continue
                     
-                    # Get all enabled SNMP devices
-                    configs = self.db.session.query(SNMPConfig).filter_by(enabled=True).all()
+                    polling_interval_ms = config.polling_interval or 1000
+                    next_due_ns = now_ns + polling_interval_ms * 1_000_000
+                    self._scheduled[(kind, device_id)] = (next_due_ns, polling_interval_ms)
+                    heapq.heappush(self._schedule, (next_due_ns, kind, device_id))
                     
-                    if not configs:
-                        self._stop_event.wait(5.0)
+                    if (kind, device_id) in self._in_flight:
                         continue
+                    if brokers is None:
+                        brokers = self._get_publish_brokers()
                     
-                    # Submit each device to thread pool for parallel polling
-                    futures = []
-                    for config in configs:
-                        future = self._snmp_executor.submit(
-                            self._poll_single_snmp_device,
-                            config.id
-                        )
-                        futures.append(future)
-                    
-                    # Wait for all devices to complete (with timeout)
-                    for future in futures:
-                        try:
-                            future.result(timeout=10)
-                        except Exception as e:
-                            logger.error(f"SNMP device polling error: {str(e)}")
+                    if kind == 'eip':
+                        future = self._eip_executor.submit(self._poll_single_ethernetip_device, config, brokers)
+                    else:
+                        future = self._snmp_executor.submit(self._poll_single_snmp_device, config, brokers)
+                    self._in_flight.add((kind, device_id))
+                    future.add_done_callback(partial(self._poll_done, kind, device_id))
                 
-                # Short sleep between poll cycles
-                self._stop_event.wait(0.5)
+                # Sleep until the next poll is due, waking at least once per config cache
+                # TTL to pick up added devices; bump_config_cache() and stop() wake us early
+                timeout = self._config_cache_ttl
+                if self._schedule:
+                    timeout = min(timeout, max(0.0, (self._schedule[0][0] - time.monotonic_ns()) / 1e9))
+                self._wake_event.wait(timeout)
+                self._wake_event.clear()
                 
             except Exception as e:
-                logger.error(f"Error in SNMP loop: {str(e)}", exc_info=True)
+                logger.error(f"Error in polling scheduler: {str(e)}", exc_info=True)
                 self._stop_event.wait(5.0)
     
+    def _poll_done(self, kind, device_id, future):
+        """Executor callback: mark a device's poll finished"""
+        self._in_flight.discard((kind, device_id))
+        if not future.cancelled() and future.exception():
+            logger.error(f"{kind.upper()} device polling error: {str(future.exception())}")
+    
     def _reconnect_loop(self):
-        """Reconnection loop - runs in dedicated thread"""
+        """Reconnection loop - runs in dedicated thread
+        
+        Sleeps on _reconnect_queue, which the services' status listeners feed
+        when a device or broker drops. Devices that fail to reconnect stay
+        pending and are retried every _reconnect_interval seconds. A full sweep
+        every _reconnect_sweep_interval seconds picks up anything that never
+        reported a transition, e.g. a config enabled while its device was down.
+        """
         logger.info("Reconnection thread started")
+        pending = set()  # {(kind, device_id)} awaiting reconnection
+        sweep_interval_ns = self._reconnect_sweep_interval * 1_000_000_000
+        last_sweep_ns = None
         
         while not self._stop_event.is_set():
             try:
-                with self.app.app_context():
-                    from models import EthernetIPConfig, SNMPConfig, MQTTConfig
-                    self._reconnect_offline_devices(EthernetIPConfig, SNMPConfig, MQTTConfig)
+                now_ns = time.monotonic_ns()
+                if last_sweep_ns is None or now_ns - last_sweep_ns >= sweep_interval_ns:
+                    last_sweep_ns = now_ns
+                    pending.update(self._offline_devices())
                 
-                # Check every 10 seconds
-                self._stop_event.wait(10.0)
+                if pending:
+                    self._reconnect_pending(pending)
+                
+                # Wait for the next disconnect, or until pending devices are due a retry
+                try:
+                    item = self._reconnect_queue.get(timeout=self._reconnect_interval)
+                except queue.Empty:
+                    continue
+                if item is None:  # stop() sentinel
+                    break
+                pending.add(item)
                 
             except Exception as e:
                 logger.error(f"Error in reconnection loop: {str(e)}", exc_info=True)
                 self._stop_event.wait(10.0)
     
-    def _poll_single_ethernetip_device(self, config_id):
-        """Poll a single EthernetIP device (runs in thread pool worker)"""
+    def _poll_single_ethernetip_device(self, config, brokers):
+        """Poll a single EthernetIP device (runs in thread pool worker)
+        
+        config comes from the config cache with its enabled tags already loaded;
+        brokers is this cycle's _get_publish_brokers() list.
+        """
         try:
-            with self.app.app_context():
-                from models import EthernetIPConfig, EthernetIPTag, MQTTConfig
-                
-                config = self.db.session.query(EthernetIPConfig).get(config_id)
-                if not config or not config.enabled:
-                    return
-                
-                # Check if device is connected
-                if not self.eip_service:
-                    return
-                
-                status = self.eip_service.get_connection_status(config.id)
-                if not status.get('connected', False):
-                    return
-                
-                # Check device-level polling interval
-                polling_interval_ms = config.polling_interval or 1000
-                
-                with self._lock:
-                    if config.id in self._last_poll_time:
-                        elapsed_ms = (datetime.utcnow() - self._last_poll_time[config.id]).total_seconds() * 1000
-                        if elapsed_ms < polling_interval_ms:
-                            return
-                    self._last_poll_time[config.id] = datetime.utcnow()
-                
-                # Get all enabled tags
-                tags = self.db.session.query(EthernetIPTag).filter_by(
-                    config_id=config.id,
-                    enabled=True
-                ).all()
-                
-                # Collect tag values
-                tag_data = {}
-                for tag in tags:
-                    try:
-                        success, value = self.eip_service.read_tag(tag)
-                        if success:
-                            tag.last_value = str(value)
-                            tag.last_read = datetime.utcnow()
-                            self.db.session.commit()
-                            tag_data[tag.tag_name] = value
-                            
-                            if self.data_logging_service:
-                                self.data_logging_service.log_value(
-                                    source_type='ethernetip',
-                                    source_id=tag.id,
-                                    source_name=f"{config.name}/{tag.tag_name}",
-                                    value=value
-                                )
-                    except Exception as e:
-                        logger.error(f"Error reading tag {tag.tag_name}: {str(e)}")
+            from models import EthernetIPTag
+            
+            # Check if device is enabled and connected
+            if not config.enabled or not self.eip_service or not self._connected.get(f"eip_{config.id}", False):
+                return
+            
+            # Collect tag values
+            tag_data = {}
+            tag_updates = []
+            log_entries = []
+            # One multi-tag request per device instead of one CIP transaction per tag
+            tags = config.tags
+            results = self.eip_service.read_tags(config, [tag.tag_name for tag in tags])
+            for tag, (success, value) in zip(tags, results):
+                try:
+                    if success:
+                        tag_updates.append({'id': tag.id, 'last_value': str(value), 'last_read': datetime.utcnow()})
+                        tag_data[tag.tag_name] = value
+                        log_entries.append({
+                            'source_type': 'ethernetip',
+                            'source_id': tag.id,
+                            'source_name': f"{config.name}/{tag.tag_name}",
+                            'value': value
+                        })
+                except Exception as e:
+                    logger.error(f"Error reading tag {tag.tag_name}: {str(e)}")
+            
+            # Persist all tag updates in one transaction
+            self._save_read_values(EthernetIPTag, tag_updates, config.name)
+            self._log_values(log_entries)
+            
+            # Publish collected data
+            if tag_data:
+                device_log_key = f"eip_poll_{config.id}"
+                should_log = self._should_log(device_log_key)
+                if should_log:
+                    logger.info(f"✓ Polled {config.name}: {len(tag_data)} tags")
                 
-                # Publish collected data
-                if tag_data:
-                    device_log_key = f"eip_poll_{config.id}"
-                    should_log = self._should_log(device_log_key)
-                    if should_log:
-                        logger.info(f"✓ Polled {config.name}: {len(tag_data)} tags")
+                # Skip the publish when nothing changed, unless a keyframe is due. With no broker
+                # connected nothing is sent, so leave the values unrecorded for the next publish.
+                delta = self._changed_values(f"eip_{config.id}", tag_data) if brokers else None
+                if delta:
                     self._publish_device_data(
-                        MQTTConfig,
+                        brokers,
                         device_name=config.name,
                         device_config=config,
                         tag_data=tag_data,
+                        delta=delta,
                         log_publish=should_log
                     )
         
         except Exception as e:
-            logger.error(f"Error polling EthernetIP device {config_id}: {str(e)}")
+            logger.error(f"Error polling EthernetIP device {config.id}: {str(e)}")
     
-    def _poll_single_snmp_device(self, config_id):
-        """Poll a single SNMP device (runs in thread pool worker)"""
+    def _poll_single_snmp_device(self, config, brokers):
+        """Poll a single SNMP device (runs in thread pool worker)
+        
+        config comes from the config cache with its enabled objects already loaded;
+        brokers is this cycle's _get_publish_brokers() list.
+        """
         try:
-            with self.app.app_context():
-                from models import SNMPConfig, SNMPObject, MQTTConfig
-                
-                config = self.db.session.query(SNMPConfig).get(config_id)
-                if not config or not config.enabled:
-                    return
-                
-                # Check if device is connected
-                if not self.snmp_service:
-                    return
-                
-                status = self.snmp_service.get_connection_status(config.id)
-                if not status.get('connected', False):
-                    return
-                
-                # Check device-level polling interval
-                device_id = f"snmp_{config.id}"
-                polling_interval_ms = config.polling_interval or 1000
-                
-                with self._lock:
-                    if device_id in self._last_poll_time:
-                        elapsed_ms = (datetime.utcnow() - self._last_poll_time[device_id]).total_seconds() * 1000
-                        if elapsed_ms < polling_interval_ms:
-                            return
-                    self._last_poll_time[device_id] = datetime.utcnow()
-                
-                # Get all enabled objects
-                objects = self.db.session.query(SNMPObject).filter_by(
-                    config_id=config.id,
-                    enabled=True
-                ).all()
-                
-                # Collect object values
-                object_data = {}
-                for obj in objects:
-                    try:
-                        success, value = self.snmp_service.read_oid(obj)
-                        if success:
-                            obj.last_value = str(value)
-                            obj.last_read = datetime.utcnow()
-                            self.db.session.commit()
-                            
-                            key = obj.description or obj.oid.replace('.', '_')
-                            object_data[key] = value
-                            
-                            if self.data_logging_service:
-                                self.data_logging_service.log_value(
-                                    source_type='snmp',
-                                    source_id=obj.id,
-                                    source_name=f"{config.name}/{obj.oid}",
-                                    value=value
-                                )
-                    except Exception as e:
-                        logger.error(f"Error reading SNMP OID {obj.oid}: {str(e)}")
+            from models import SNMPObject
+            
+            # Check if device is enabled and connected
+            device_id = f"snmp_{config.id}"
+            if not config.enabled or not self.snmp_service or not self._connected.get(device_id, False):
+                return
+            
+            # Collect object values
+            object_data = {}
+            object_updates = []
+            log_entries = []
+            # One multi-varbind GET per chunk of objects instead of one request per OID
+            objects = config.objects
+            results = self.snmp_service.read_oids(config, objects)
+            for obj, (success, value) in zip(objects, results):
+                try:
+                    if success:
+                        object_updates.append({'id': obj.id, 'last_value': str(value), 'last_read': datetime.utcnow()})
+                        
+                        key = obj.description or obj.oid.replace('.', '_')
+                        object_data[key] = value
+                        log_entries.append({
+                            'source_type': 'snmp',
+                            'source_id': obj.id,
+                            'source_name': f"{config.name}/{obj.oid}",
+                            'value': value
+                        })
+                except Exception as e:
+                    logger.error(f"Error reading SNMP OID {obj.oid}: {str(e)}")
+            
+            # Persist all object updates in one transaction
+            self._save_read_values(SNMPObject, object_updates, config.name)
+            self._log_values(log_entries)
+            
+            # Publish collected data
+            if object_data:
+                device_log_key = f"snmp_poll_{config.id}"
+                should_log = self._should_log(device_log_key)
+                if should_log:
+                    logger.info(f"✓ Polled {config.name}: {len(object_data)} objects")
                 
-                # Publish collected data
-                if object_data:
-                    device_log_key = f"snmp_poll_{config.id}"
-                    should_log = self._should_log(device_log_key)
-                    if should_log:
-                        logger.info(f"✓ Polled {config.name}: {len(object_data)} objects")
+                # Skip the publish when nothing changed, unless a keyframe is due. With no broker
+                # connected nothing is sent, so leave the values unrecorded for the next publish.
+                delta = self._changed_values(f"snmp_{config.id}", object_data) if brokers else None
+                if delta:
                     self._publish_device_data(
-                        MQTTConfig,
+                        brokers,
                         device_name=config.name,
                         device_config=config,
                         tag_data=object_data,
+                        delta=delta,
                         log_publish=should_log
                     )
         
         except Exception as e:
-            logger.error(f"Error polling SNMP device {config_id}: {str(e)}")
+            logger.error(f"Error polling SNMP device {config.id}: {str(e)}")
     
-    def _reconnect_offline_devices(self, EthernetIPConfig, SNMPConfig, MQTTConfig):
-        """Try to reconnect offline devices every 10 seconds"""
+    def _save_read_values(self, model, updates, device_name):
+        """Write last_value/last_read for one device's reads in a single transaction
+        
+        Uses a session from the worker's own factory rather than the shared
+        Flask-SQLAlchemy scoped session, so no app context is needed.
+        """
+        if not updates:
+            return
+        
+        session = self._session_factory()
         try:
-            current_time = datetime.utcnow()
+            session.bulk_update_mappings(model, updates)
+            session.commit()
+        except Exception as e:
+            logger.error(f"Error saving read values for {device_name}: {str(e)}")
+            session.rollback()
+        finally:
+            session.close()
+    
+    def _log_values(self, entries):
+        """Queue one device's readings for the log writer thread"""
+        if not entries or not self.data_logging_service:
+            return
+        
+        timestamp = datetime.utcnow()
+        for entry in entries:
+            entry['timestamp'] = timestamp
+            self._log_queue.put(entry)
+    
+    def _log_writer_loop(self):
+        """Data log writer loop - runs in dedicated thread"""
+        logger.info("Data log writer thread started")
+        
+        while not self._stop_event.is_set():
+            try:
+                # Block briefly for the first row, then take whatever else is waiting
+                try:
+                    batch = [self._log_queue.get(timeout=1.0)]
+                except queue.Empty:
+                    continue
+                self._write_log_batches(batch)
+            except Exception as e:
+                logger.error(f"Error in data log writer loop: {str(e)}", exc_info=True)
+                self._stop_event.wait(1.0)
+    
+    def _write_log_batches(self, batch=None):
+        """Insert queued log rows, up to _log_batch_size rows per transaction"""
+        batch = batch or []
+        while True:
+            while len(batch) < self._log_batch_size:
+                try:
+                    batch.append(self._log_queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
             
-            # Check EthernetIP devices
-            if self.eip_service:
-                eip_configs = self.db.session.query(EthernetIPConfig).filter_by(enabled=True).all()
-                for config in eip_configs:
-                    device_key = f"eip_{config.id}"
-                    status = self.eip_service.get_connection_status(config.id)
-                    
-                    # If device is not connected, try to reconnect
-                    if not status.get('connected', False):
-                        # Check if we should attempt reconnection
-                        if device_key in self._last_reconnect_attempt:
-                            elapsed = (current_time - self._last_reconnect_attempt[device_key]).total_seconds()
-                            if elapsed < self._reconnect_interval:
-                                continue  # Too soon to retry
-                        
-                        # Attempt reconnection
-                        self._last_reconnect_attempt[device_key] = current_time
-                        logger.info(f"Attempting to reconnect EthernetIP device: {config.name}")
-                        success, message = self.eip_service.connect_device(config)
-                        if success:
-                            logger.info(f"✓ Reconnected to {config.name}")
-                        else:
-                            logger.debug(f"✗ Reconnection failed for {config.name}: {message}")
+            session = self._session_factory()
+            try:
+                self.data_logging_service.log_values(batch, session=session)
+            finally:
+                session.close()
             
-            # Check SNMP devices
-            if self.snmp_service:
-                snmp_configs = self.db.session.query(SNMPConfig).filter_by(enabled=True).all()
-                for config in snmp_configs:
-                    device_key = f"snmp_{config.id}"
-                    status = self.snmp_service.get_connection_status(config.id)
-                    
-                    # If device is not connected, try to reconnect
-                    if not status.get('connected', False):
-                        # Check if we should attempt reconnection
-                        if device_key in self._last_reconnect_attempt:
-                            elapsed = (current_time - self._last_reconnect_attempt[device_key]).total_seconds()
-                            if elapsed < self._reconnect_interval:
-                                continue  # Too soon to retry
-                        
-                        # Attempt reconnection
-                        self._last_reconnect_attempt[device_key] = current_time
-                        logger.info(f"Attempting to reconnect SNMP device: {config.name}")
-                        success, message = self.snmp_service.connect_device(config)
-                        if success:
-                            logger.info(f"✓ Reconnected to {config.name}")
-                        else:
-                            logger.debug(f"✗ Reconnection failed for {config.name}: {message}")
+            if len(batch) < self._log_batch_size:
+                return
+            batch = []
+    
+
+    def _on_status_change(self, kind, device_id, connected):
+        """Status listener registered with the EthernetIP, SNMP and MQTT services"""
+        self._connected[f"{kind}_{device_id}"] = connected
+        if not connected:
+            self._reconnect_queue.put((kind, device_id))
+    
+    def _offline_devices(self):
+        """(kind, device_id) for every enabled device and broker that is not connected"""
+        from models import EthernetIPConfig, SNMPConfig, MQTTConfig
+        
+        offline = []
+        for kind, service, model in (('eip', self.eip_service, EthernetIPConfig),
+                                     ('snmp', self.snmp_service, SNMPConfig),
+                                     ('mqtt', self.mqtt_service, MQTTConfig)):
+            if service:
+                offline.extend(
+                    (kind, config.id) for config in self._get_cached_configs(kind, model)
+                    if not self._connected.get(f"{kind}_{config.id}", False)
+                )
+        return offline
+    
+    def _reconnect_pending(self, pending):
+        """Try to reconnect each pending device, at most once per _reconnect_interval.
+        
+        Entries are removed from pending once reconnected, disabled or deleted.
+        """
+        from models import EthernetIPConfig, SNMPConfig, MQTTConfig
+        
+        models_by_kind = {'eip': EthernetIPConfig, 'snmp': SNMPConfig, 'mqtt': MQTTConfig}
+        now_ns = time.monotonic_ns()
+        reconnect_interval_ns = self._reconnect_interval * 1_000_000_000
+        configs = {}  # {kind: {device_id: config}}, loaded on first use
+        
+        for kind, device_id in list(pending):
+            try:
+                if kind not in configs:
+                    configs[kind] = {c.id: c for c in self._get_cached_configs(kind, models_by_kind[kind])}
+                config = configs[kind].get(device_id)
+                device_key = f"{kind}_{device_id}"
+                
+                if config is None or self._connected.get(device_key, False):
+                    pending.discard((kind, device_id))
+                    continue
+                
+                # Check if we should attempt reconnection
+                last_ns = self._last_reconnect_attempt.get(device_key)
+                if last_ns is not None and now_ns - last_ns < reconnect_interval_ns:
+                    continue  # Too soon to retry
+                
+                # Attempt reconnection
+                self._last_reconnect_attempt[device_key] = now_ns
+                if kind == 'eip':
+                    logger.info(f"Attempting to reconnect EthernetIP device: {config.name}")
+                    success, message = self.eip_service.connect_device(config)
+                elif kind == 'snmp':
+                    logger.info(f"Attempting to reconnect SNMP device: {config.name}")
+                    success, message = self.snmp_service.connect_device(config)
+                else:
+                    logger.info(f"Attempting to reconnect MQTT broker: {config.name}")
+                    success, message = self.mqtt_service.connect_broker(config)
+                    if config.subscribe_topic:
+                        self.mqtt_service.restart_subscriber(config, self.app)
+                
+                if success:
+                    logger.info(f"✓ Reconnected to {config.name}")
+                    pending.discard((kind, device_id))
+                else:
+                    logger.debug(f"✗ Reconnection failed for {config.name}: {message}")
             
-            # Check MQTT brokers
-            if self.mqtt_service:
-                from models import MQTTConfig
-                mqtt_configs = self.db.session.query(MQTTConfig).filter_by(enabled=True).all()
-                for config in mqtt_configs:
-                    device_key = f"mqtt_{config.id}"
-                    status = self.mqtt_service.get_connection_status(config.id)
-                    
-                    # If broker is not connected, try to reconnect
-                    if not status.get('connected', False):
-                        # Check if we should attempt reconnection
-                        if device_key in self._last_reconnect_attempt:
-                            elapsed = (current_time - self._last_reconnect_attempt[device_key]).total_seconds()
-                            if elapsed < self._reconnect_interval:
-                                continue  # Too soon to retry
-                        
-                        # Attempt reconnection
-                        self._last_reconnect_attempt[device_key] = current_time
-                        logger.info(f"Attempting to reconnect MQTT broker: {config.name}")
-                        success, message = self.mqtt_service.connect_broker(config)
-                        if self.mqtt_service and config.subscribe_topic:
-                            self.mqtt_service.restart_subscriber(config, self.app)
-                        if success:
-                            logger.info(f"✓ Reconnected to MQTT broker {config.name}")
-                        else:
-                            logger.debug(f"✗ Reconnection failed for {config.name}: {message}")
+            except Exception as e:
+                logger.error(f"Error reconnecting {kind} device {device_id}: {str(e)}")
+    
+    def _get_publish_brokers(self):
+        """Connected MQTT brokers with a publish topic, as (mqtt_config, publish_topic, publish_format)"""
+        if not self.mqtt_service:
+            return []
         
-        except Exception as e:
-            logger.error(f"Error in reconnect_offline_devices: {str(e)}")
+        from models import MQTTConfig
+        
+        brokers = []
+        for mqtt_config in self._get_cached_configs('mqtt', MQTTConfig):
+            if not mqtt_config.publish_topic or not self._connected.get(f"mqtt_{mqtt_config.id}", False):
+                continue
+            publish_format = 'string' if (mqtt_config.publish_format or 'json').lower() == 'string' else 'json'
+            brokers.append((mqtt_config, mqtt_config.publish_topic, publish_format))
+        return brokers
     
-    def _publish_device_data(self, MQTTConfig, device_name, device_config, tag_data, log_publish=True):
-        """Publish all tags from a device in a single payload to MQTT brokers"""
+    def _changed_values(self, device_key, values):
+        """Return the values that changed since the last publish for device_key.
+        
+        Every _keyframe_interval_ns the full set is returned instead, so
+        consumers that missed a delta (or joined late) resynchronise.
+        Each device is polled by one worker at a time, so no lock is needed.
+        """
+        now_ns = time.monotonic_ns()
+        previous = self._last_published.get(device_key)
+        if previous is None or now_ns - previous[0] >= self._keyframe_interval_ns:
+            self._last_published[device_key] = (now_ns, dict(values))
+            return values
+        
+        last_values = previous[1]
+        delta = {k: v for k, v in values.items() if k not in last_values or last_values[k] != v}
+        last_values.update(delta)
+        return delta
+    
+    def _publish_device_data(self, brokers, device_name, device_config, tag_data, delta=None, log_publish=True):
+        """Publish all tags from a device in a single payload to MQTT brokers
+        
+        JSON payloads carry only delta when it is given; CSV rows are positional,
+        so they always carry every value in tag_data.
+        """
         try:
-            # Get all enabled MQTT brokers
-            mqtt_configs = self.db.session.query(MQTTConfig).filter_by(enabled=True).all()
-            
-            if not mqtt_configs:
+            if not brokers:
                 return
             
-            for mqtt_config in mqtt_configs:
+            # Identical for every broker, so build these once per device sample
+            # Use HWID if available, otherwise fall back to device ID
+            device_identifier = device_config.hwid if device_config.hwid else device_config.id
+            timestamp = datetime.utcnow().isoformat()
+            payloads = {}  # {'string'|'json': str or bytes payload}, built on first use
+            
+            for mqtt_config, publish_topic, publish_format in brokers:
                 try:
-                    if not self.mqtt_service:
-                        logger.warning("MQTT service not available")
-                        continue
-                    
-                    # Check if broker is connected
-                    broker_status = self.mqtt_service.get_connection_status(mqtt_config.id)
-                    if not broker_status.get('connected', False):
-                        logger.debug(f"MQTT broker {mqtt_config.broker} not connected")
-                        continue
-                    
-                    # Check if publish_topic is configured
-                    if not mqtt_config.publish_topic:
-                        logger.debug(f"No publish topic configured for MQTT broker {mqtt_config.name}")
-                        continue
-                    
-                    # Use HWID if available, otherwise fall back to device ID
-                    device_identifier = device_config.hwid if device_config.hwid else device_config.id
-                    
                     # Use the configured publish topic directly (with device identifier appended)
-                    topic = f"{mqtt_config.publish_topic}/{device_identifier}"
-                    
-                    # Get format preference
-                    publish_format = mqtt_config.publish_format or 'json'
+                    topic = f"{publish_topic}/{device_identifier}"
                     
                     # Format payload based on configuration
-                    if publish_format.lower() == 'string':
-                        # CSV format: HWID,Tag1_value,Tag2_value,...,Timestamp
-                        timestamp = datetime.utcnow().isoformat()
-                        tag_values = ','.join(str(v) for v in tag_data.values())
-                        payload_str = f"{device_identifier},{tag_values},{timestamp}"
-                    else:
-                        # JSON format (default): {"HWID": hwid/id, "Tag1": value, "Tag2": value, ..., "Timestamp": "..."}
-                        import json
-                        payload = {
-                            'HWID': device_identifier,
-                            **tag_data,
-                            'Timestamp': datetime.utcnow().isoformat()
-                        }
-                        payload_str = json.dumps(payload)
+                    payload_out = payloads.get(publish_format)
+                    if payload_out is None:
+                        if publish_format == 'string':
+                            # CSV format: HWID,Tag1_value,Tag2_value,...,Timestamp
+                            tag_values = ','.join([str(v) for v in tag_data.values()])
+                            payload_out = f"{device_identifier},{tag_values},{timestamp}"
+                        else:
+                            # JSON format (default): {"HWID": hwid/id, "Tag1": value, "Tag2": value, ..., "Timestamp": "..."}
+                            payload = {
+                                'HWID': device_identifier,
+                                **(delta if delta is not None else tag_data),
+                                'Timestamp': timestamp
+                            }
+                            # orjson returns bytes, which the MQTT service publishes as-is.
+                            # Timestamp stays an isoformat string so both encoders emit the same text.
+                            payload_out = orjson.dumps(payload) if orjson is not None else json.dumps(payload)
+                        payloads[publish_format] = payload_out
                     
-                    # Publish to broker using the low-level publish method
-                    success, message = self.mqtt_service.publish(mqtt_config, topic, payload_str)
+                    # Queue for the flusher thread, which publishes each broker's messages as a batch
+                    self._enqueue_publish(mqtt_config, topic, payload_out)
                     
-                    if success:
-                        if log_publish:
-                            logger.info(f"✓ Published {device_name} → {mqtt_config.name} ({topic})")
-                    else:
-                        logger.warning(f"✗ Failed to publish {device_name} to {mqtt_config.name}: {message}")
+                    if log_publish:
+                        logger.info(f"✓ Queued {device_name} → {mqtt_config.name} ({topic})")
                 
                 except Exception as e:
                     logger.error(f"Error publishing to MQTT broker {mqtt_config.name}: {str(e)}")
@@ -478,6 +615,42 @@ class PollingService:
         except Exception as e:
             logger.error(f"Error in publish_device_data: {str(e)}")
     
+    def _enqueue_publish(self, mqtt_config, topic, payload, qos=0):
+        """Queue a message for the next batch flush to mqtt_config's broker"""
+        with self._publish_queue_lock:
+            entry = self._publish_queues.get(mqtt_config.id)
+            messages = entry[1] if entry else deque()
+            # Keep the most recently loaded config for the flusher
+            self._publish_queues[mqtt_config.id] = (mqtt_config, messages)
+            messages.append((topic, payload, qos))
+    
+    def _flush_loop(self):
+        """MQTT flush loop - runs in dedicated thread"""
+        logger.info("MQTT flusher thread started")
+        
+        while not self._stop_event.is_set():
+            try:
+                self._flush_publish_queues()
+            except Exception as e:
+                logger.error(f"Error in MQTT flush loop: {str(e)}", exc_info=True)
+            self._stop_event.wait(self._flush_interval)
+    
+    def _flush_publish_queues(self):
+        """Publish every queued message, one publish_many call per broker"""
+        with self._publish_queue_lock:
+            pending = self._publish_queues
+            self._publish_queues = {}
+        
+        for mqtt_config, messages in pending.values():
+            if not messages:
+                continue
+            try:
+                success, message = self.mqtt_service.publish_many(mqtt_config, list(messages))
+                if not success:
+                    logger.warning(f"✗ Failed to publish to {mqtt_config.name}: {message}")
+            except Exception as e:
+                logger.error(f"Error publishing to MQTT broker {mqtt_config.name}: {str(e)}")
+    
     def _publish_to_mqtt(self, MQTTConfig, topic, payload):
         """Publish data to all connected MQTT brokers"""
         try:
@@ -486,7 +659,7 @@ class PollingService:
                 return
             
             # Get all enabled MQTT brokers
-            mqtt_configs = self.db.session.query(MQTTConfig).filter_by(enabled=True).all()
+            mqtt_configs = self._get_cached_configs('mqtt', MQTTConfig)
             logger.info(f"Publishing to {len(mqtt_configs)} MQTT brokers")
             
             for mqtt_config in mqtt_configs:
@@ -513,27 +686,66 @@ class PollingService:
         except Exception as e:
             logger.error(f"Error publishing to MQTT: {str(e)}")
     
-    def _should_log(self, log_key):
-        """Determine if we should log based on interval (throttling)"""
-        current_time = datetime.utcnow()
+    def _get_cached_configs(self, kind, model):
+        """Return enabled rows of model, re-querying only when the cached copy is older than the TTL.
         
-        with self._lock:
-            if log_key not in self._last_log_time:
-                self._last_log_time[log_key] = current_time
-                return True
-            
-            elapsed = (current_time - self._last_log_time[log_key]).total_seconds()
-            if elapsed >= self._log_interval:
-                self._last_log_time[log_key] = current_time
-                return True
+        EthernetIP and SNMP configs come with their enabled tags/objects
+        (and each child's config) eager-loaded in one extra IN query, so the
+        poll workers never touch the database to find what to read. Rows are
+        loaded through a short-lived session from _session_factory and are
+        detached when it closes, so they stay readable from any thread.
+        """
+        cached = self._config_cache.get(kind)
+        now = time.monotonic()
+        if cached and now - cached[0] < self._config_cache_ttl:
+            return cached[1]
+        
+        from sqlalchemy.orm import selectinload
+        from models import EthernetIPTag, SNMPObject
+        
+        session = self._session_factory()
+        try:
+            query = session.query(model).filter_by(enabled=True)
+            if kind == 'eip':
+                query = query.options(
+                    selectinload(model.tags.and_(EthernetIPTag.enabled == True)).selectinload(EthernetIPTag.config)
+                )
+            elif kind == 'snmp':
+                query = query.options(
+                    selectinload(model.objects.and_(SNMPObject.enabled == True)).selectinload(SNMPObject.config)
+                )
+            rows = query.all()
+        finally:
+            session.close()
+        self._config_cache[kind] = (now, rows)
+        return rows
+    
+    def bump_config_cache(self, kind=None):
+        """Drop cached configs of one kind ('eip', 'snmp', 'mqtt'), or all kinds, after an edit"""
+        if kind is None:
+            self._config_cache = {}
+        else:
+            self._config_cache.pop(kind, None)
+        self._wake_event.set()  # Let the scheduler pick up added devices right away
+    
+    def _should_log(self, log_key):
+        """Determine if we should log based on interval (throttling)
         
+        Lock-free: throttling is advisory, so a duplicate log line under a race is fine.
+        """
+        now_ns = time.monotonic_ns()
+        last_ns = self._last_log_time.get(log_key)
+        if last_ns is None or now_ns - last_ns >= self._log_interval_ns:
+            self._last_log_time[log_key] = now_ns
+            return True
         return False
     
     def get_status(self):
         """Get polling service status"""
         return {
             'running': self._running,
-            'eip_thread_alive': self._eip_thread.is_alive() if self._eip_thread else False,
-            'snmp_thread_alive': self._snmp_thread.is_alive() if self._snmp_thread else False,
-            'reconnect_thread_alive': self._reconnect_thread.is_alive() if self._reconnect_thread else False
+            'scheduler_thread_alive': self._scheduler_thread.is_alive() if self._scheduler_thread else False,
+            'reconnect_thread_alive': self._reconnect_thread.is_alive() if self._reconnect_thread else False,
+            'flush_thread_alive': self._flush_thread.is_alive() if self._flush_thread else False,
+            'log_writer_thread_alive': self._log_writer_thread.is_alive() if self._log_writer_thread else False
         }
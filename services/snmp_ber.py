@@ -0,0 +1,172 @@
+"""Minimal BER codec for SNMPv2c GetRequest/Response messages.
+
+Covers only what the polling hot path needs: encoding a GetRequest for numeric OIDs and
+decoding the matching Response into printable values. Anything else (MIB names, SET,
+SNMPv3) goes through pysnmp's hlapi.
+"""
+
+SNMP_VERSION_2C = 1
+
+TAG_INTEGER = 0x02
+TAG_OCTET_STRING = 0x04
+TAG_NULL = 0x05
+TAG_OID = 0x06
+TAG_SEQUENCE = 0x30
+TAG_IPADDRESS = 0x40
+TAG_COUNTER32 = 0x41
+TAG_GAUGE32 = 0x42
+TAG_TIMETICKS = 0x43
+TAG_OPAQUE = 0x44
+TAG_COUNTER64 = 0x46
+TAG_NO_SUCH_OBJECT = 0x80
+TAG_NO_SUCH_INSTANCE = 0x81
+TAG_END_OF_MIB_VIEW = 0x82
+TAG_GET_REQUEST = 0xA0
+TAG_RESPONSE = 0xA2
+
+# Same wording pysnmp's prettyPrint() uses, so both read paths report identical values
+EXCEPTION_VALUES = {
+    TAG_NO_SUCH_OBJECT: 'No Such Object currently exists at this OID',
+    TAG_NO_SUCH_INSTANCE: 'No Such Instance currently exists at this OID',
+    TAG_END_OF_MIB_VIEW: 'No more variables left in this MIB View',
+}
+
+UNSIGNED_TAGS = (TAG_COUNTER32, TAG_GAUGE32, TAG_TIMETICKS, TAG_COUNTER64)
+
+
+def _encode_length(length):
+    if length < 0x80:
+        return bytes((length,))
+    body = length.to_bytes((length.bit_length() + 7) // 8, 'big')
+    return bytes((0x80 | len(body),)) + body
+
+
+def _tlv(tag, body):
+    return bytes((tag,)) + _encode_length(len(body)) + body
+
+
+def _encode_integer(value):
+    return _tlv(TAG_INTEGER, value.to_bytes(value.bit_length() // 8 + 1, 'big', signed=True))
+
+
+def parse_oid(oid):
+    """Return the arcs of a dotted numeric OID; raises ValueError for anything else (e.g. MIB names)"""
+    arcs = tuple(int(arc) for arc in oid.strip('.').split('.'))
+    if len(arcs) < 2 or arcs[0] > 2 or (arcs[0] < 2 and arcs[1] >= 40) or min(arcs) < 0:
+        raise ValueError(f"Not a numeric OID: {oid}")
+    return arcs
+
+
+def _encode_oid(arcs):
+    body = bytearray()
+    for arc in (arcs[0] * 40 + arcs[1],) + arcs[2:]:
+        chunk = [arc & 0x7F]
+        arc >>= 7
+        while arc:
+            chunk.append(0x80 | (arc & 0x7F))
+            arc >>= 7
+        body.extend(reversed(chunk))
+    return _tlv(TAG_OID, bytes(body))
+
+
+def encode_get_request(community, request_id, oids):
+    """Build an SNMPv2c GetRequest message for the given dotted numeric OIDs"""
+    varbinds = b''.join(_tlv(TAG_SEQUENCE, _encode_oid(parse_oid(oid)) + b'\x05\x00') for oid in oids)
+    pdu = _tlv(TAG_GET_REQUEST, _encode_integer(request_id) + _encode_integer(0) + _encode_integer(0) + _tlv(TAG_SEQUENCE, varbinds))
+    return _tlv(TAG_SEQUENCE, _encode_integer(SNMP_VERSION_2C) + _tlv(TAG_OCTET_STRING, community.encode()) + pdu)
+
+
+def _read_tlv(data, pos):
+    """Return (tag, start, end) of the TLV at pos, where data[start:end] is its value"""
+    if pos + 2 > len(data):
+        raise ValueError("Truncated BER data")
+    tag = data[pos]
+    length = data[pos + 1]
+    pos += 2
+    if length & 0x80:
+        size = length & 0x7F
+        if size == 0 or pos + size > len(data):
+            raise ValueError("Unsupported BER length")
+        length = int.from_bytes(data[pos:pos + size], 'big')
+        pos += size
+    if pos + length > len(data):
+        raise ValueError("Truncated BER data")
+    return tag, pos, pos + length
+
+
+def _decode_oid(body):
+    arcs = []
+    arc = 0
+    for byte in body:
+        arc = (arc << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            arcs.append(arc)
+            arc = 0
+    if not arcs:
+        raise ValueError("Empty OID")
+    first = arcs[0]
+    head = [min(first // 40, 2), first - 40 * min(first // 40, 2)]
+    return '.'.join(str(a) for a in head + arcs[1:])
+
+
+def _format_octets(body):
+    # pysnmp shows printable strings as text and anything else as 0x-prefixed hex
+    if all(32 <= b < 127 or b in (9, 10, 13) for b in body):
+        return body.decode('ascii')
+    return '0x' + body.hex()
+
+
+def _decode_value(tag, body):
+    if tag == TAG_INTEGER:
+        return str(int.from_bytes(body, 'big', signed=True))
+    if tag in UNSIGNED_TAGS:
+        return str(int.from_bytes(body, 'big'))
+    if tag == TAG_OCTET_STRING:
+        return _format_octets(body)
+    if tag == TAG_OID:
+        return _decode_oid(body)
+    if tag == TAG_IPADDRESS:
+        return '.'.join(str(b) for b in body)
+    if tag in EXCEPTION_VALUES:
+        return EXCEPTION_VALUES[tag]
+    if tag == TAG_NULL:
+        return ''
+    return '0x' + body.hex()
+
+
+def decode_response(data):
+    """Parse an SNMPv2c Response message.
+
+    Returns (request_id, error_status, error_index, [(oid, value), ...]) with values as strings;
+    raises ValueError on anything that is not a well-formed Response.
+    """
+    tag, start, end = _read_tlv(data, 0)
+    if tag != TAG_SEQUENCE:
+        raise ValueError("Not an SNMP message")
+
+    tag, pos, version_end = _read_tlv(data, start)  # version
+    tag, pos, community_end = _read_tlv(data, version_end)  # community
+    tag, pos, pdu_end = _read_tlv(data, community_end)
+    if tag != TAG_RESPONSE:
+        raise ValueError(f"Unexpected PDU type 0x{tag:02x}")
+
+    fields = []
+    for _ in range(3):
+        tag, value_start, pos = _read_tlv(data, pos)
+        if tag != TAG_INTEGER:
+            raise ValueError("Malformed PDU header")
+        fields.append(int.from_bytes(data[value_start:pos], 'big', signed=True))
+    request_id, error_status, error_index = fields
+
+    tag, pos, list_end = _read_tlv(data, pos)
+    varbinds = []
+    while pos < list_end:
+        tag, bind_start, bind_end = _read_tlv(data, pos)
+        tag, oid_start, oid_end = _read_tlv(data, bind_start)
+        if tag != TAG_OID:
+            raise ValueError("Malformed varbind")
+        value_tag, value_start, value_end = _read_tlv(data, oid_end)
+        varbinds.append((_decode_oid(data[oid_start:oid_end]), _decode_value(value_tag, data[value_start:value_end])))
+        pos = bind_end
+
+    return request_id, error_status, error_index, varbinds
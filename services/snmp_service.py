@@ -1,144 +1,484 @@
 import logging
+import os
 from datetime import datetime
 import threading
+import asyncio
+import sys
+import time
+import socket
+import itertools
+import functools
+import ipaddress
+import math
+import queue
+from collections import OrderedDict
+from types import SimpleNamespace
+
+from pysnmp.hlapi.v3arch.asyncio import (
+    SnmpEngine, CommunityData, UdpTransportTarget, ContextData, ObjectType, ObjectIdentity,
+    get_cmd, bulk_cmd, set_cmd
+)
+from pysnmp.proto import rfc1902
+from pysnmp.proto.rfc1905 import EndOfMibView
+
+from services import snmp_ber
+
+try:
+    import uvloop
+except ImportError:  # optional - falls back to the stdlib asyncio loop
+    uvloop = None
 
 logger = logging.getLogger(__name__)
 
+# Varbinds per GET in read_oids; keeps responses well under typical agent PDU size limits
+READ_OIDS_PER_PDU = 32
+
+# max-repetitions for GETBULK walks: OIDs returned per round trip
+BULK_MAX_REPETITIONS = 25
+
+# max-repetitions for walk_oid, which has no object limit and so takes bigger steps
+WALK_MAX_REPETITIONS = 50
+
+# Probes in flight at once when scanning an IP range in detect_devices
+DETECT_CONCURRENCY = 256
+
+# read_oid value cache: entries live for min(polling_interval / 2, VALUE_CACHE_MAX_TTL) seconds
+VALUE_CACHE_MAX_TTL = 1.0
+VALUE_CACHE_SIZE = 10000
+
+# write_by_name saves last_value in batches of up to WRITE_BATCH_SIZE updates collected over
+# WRITE_BATCH_WINDOW seconds; callers block once WRITE_QUEUE_SIZE updates are waiting
+WRITE_BATCH_SIZE = 100
+WRITE_BATCH_WINDOW = 0.1
+WRITE_QUEUE_SIZE = 10000
+
+# Optional CPU to pin the SNMP loop thread to (Linux only), e.g. SNMP_LOOP_CPU=3 on a dedicated poller
+SNMP_LOOP_CPU = os.environ.get("SNMP_LOOP_CPU")
+
+# Optional microseconds the kernel busy-polls the shared socket for replies (SO_BUSY_POLL, Linux only),
+# e.g. SNMP_BUSY_POLL_USEC=50 alongside SNMP_LOOP_CPU on a dedicated poller; it spins a core, so 0 (off) by default
+SNMP_BUSY_POLL_USEC = int(os.environ.get("SNMP_BUSY_POLL_USEC", "0"))
+
+# write_oid data_type (upper-cased) -> (rfc1902 type, coercion applied to the value first)
+_WRITE_TYPES = {
+    'INTEGER': (rfc1902.Integer32, int),
+    'INT': (rfc1902.Integer32, int),
+    'COUNTER32': (rfc1902.Integer32, int),
+    'GAUGE32': (rfc1902.Integer32, int),
+    'STRING': (rfc1902.OctetString, str),
+    'OCTETSTRING': (rfc1902.OctetString, str),
+    'DISPLAYSTRING': (rfc1902.OctetString, str),
+    'COUNTER64': (rfc1902.Counter64, int),
+    'UNSIGNED32': (rfc1902.Unsigned32, int),
+    'IPADDRESS': (rfc1902.IpAddress, str),
+}
+_DEFAULT_WRITE_TYPE = (rfc1902.OctetString, str)
+
+# sysDescr.0, probed by connect_device and detect_devices
+SYS_DESCR_OID = '1.3.6.1.2.1.1.1.0'
+
+# pysnmp request building blocks are immutable once built, so they are cached rather than
+# re-parsed (OID strings, MIB lookups) on every request
+
+@functools.lru_cache(maxsize=4096)
+def _mk_object_type(oid):
+    return ObjectType(ObjectIdentity(oid))
+
+@functools.lru_cache(maxsize=256)
+def _community_data(community):
+    return CommunityData(community)
+
+@functools.lru_cache(maxsize=None)
+def _context_data():
+    return ContextData()
+
+# Columns produced by a discovery walk; the remaining API fields are constant per object
+WALK_COLUMNS = ('oid', 'name', 'value', 'data_type')
+
+def _column_rows(columns):
+    """Materialise walk columns into the per-object dicts returned by discover_objects"""
+    return [
+        {
+            'oid': oid,
+            'name': name,
+            'value': value,
+            'data_type': data_type,
+            'description': f"SNMP OID: {oid}",
+            'access': "read-only",  # Walks can't tell, so assume read-only
+            'status': "current"  # Typical for discovered objects
+        }
+        for oid, name, value, data_type in zip(*(columns[column] for column in WALK_COLUMNS))
+    ]
+
+class _SNMPProtocol(asyncio.DatagramProtocol):
+    """Receives replies on the shared SNMP socket and passes them to the owning service"""
+    
+    def __init__(self, service):
+        self._service = service
+    
+    def datagram_received(self, data, addr):
+        self._service._on_datagram(data, addr)
+    
+    def error_received(self, exc):
+        # ICMP errors (e.g. port unreachable) surface here; the waiting request simply times out
+        logger.debug(f"Shared SNMP socket error: {str(exc)}")
+
 class SNMPService:
-    def __init__(self):
-        self._connection_status = {}  # Dict to store status per device ID
+    def __init__(self, refresh_oids_cache_interval=3600):
+        self._connection_status = {}  # Dict to store status per device ID (written under _status_lock, see _set_status)
+        self._status_listeners = []  # callback(device_id, connected) on connected-flag changes
+        self._status_lock = threading.Lock()
         self._lock = threading.Lock()
+        
+        # Status entries store time.monotonic_ns(); this offset turns them back into wall-clock time
+        self._wall_offset = time.time() - time.monotonic()
+        
+        # One long-lived event loop serves every SNMP request, so calls no longer pay for
+        # creating and tearing down a loop, engine and UDP transport each time
+        # uvloop (libuv) makes fewer syscalls per datagram than the stdlib selector loop. It is
+        # only used for this private loop, so the process-wide event loop policy is left alone.
+        if uvloop is not None and sys.platform == 'linux':
+            self._loop = uvloop.new_event_loop()
+        else:
+            self._loop = asyncio.new_event_loop()
+        self._loop_thread = threading.Thread(target=self._loop_main, daemon=True, name="SNMP-Loop")
+        self._loop_thread.start()
+        self._engine = None  # SnmpEngine, created on the loop thread on first use
+        self._transports = {}  # (host, port, timeout, retries) -> UdpTransportTarget
+        
+        # The hand-rolled GET path multiplexes every device over one UDP socket; replies are
+        # matched to waiting requests by request-id and source address. _pending and _addresses
+        # are only touched on the loop thread, so they need no lock.
+        self._request_ids = itertools.count(1)
+        self._pending = {}  # request_id -> (asyncio.Future, address the reply must come from)
+        self._addresses = {}  # (host, port) -> resolved (ip, port)
+        try:
+            self._transport, _ = self._run(
+                self._loop.create_datagram_endpoint(lambda: _SNMPProtocol(self), sock=self._make_shared_socket()),
+                timeout=5
+            )
+        except Exception as e:
+            logger.error(f"Could not open shared SNMP socket, using pysnmp for all reads: {str(e)}")
+            self._transport = None
+        
+        # Walk results per (host, port, community, base_oid) -> (walked_at, columns); a device's
+        # OID list rarely changes, so repeat discoveries and poll_device() skip the walk
+        self.refresh_oids_cache_interval = refresh_oids_cache_interval  # seconds
+        self._oid_cache = {}
+        
+        # Recent read_oid results, (config_id, oid) -> (expires_at, value), least recently used first
+        self._value_cache = OrderedDict()
+        
+        # Per-config name -> (object id, oid, access, data_type) for write_by_name, so MQTT write
+        # commands skip the name lookup query. Plain tuples, not ORM rows, so they outlive sessions.
+        self._name_index = {}
+        self._name_index_generation = 0
+        self._name_listeners_registered = False
+        
+        # last_value updates from write_by_name, committed in batches by a writer thread started on first use
+        self._write_queue = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+        self._writer_thread = None
+        self._write_session_factory = None
+    
+    def _loop_main(self):
+        """SNMP loop thread body: optionally pin the thread to SNMP_LOOP_CPU, then run the loop"""
+        if SNMP_LOOP_CPU and hasattr(os, 'sched_setaffinity'):
+            try:
+                # pid 0 means the calling thread on Linux
+                os.sched_setaffinity(0, {int(SNMP_LOOP_CPU)})
+                logger.info(f"SNMP loop thread pinned to CPU {SNMP_LOOP_CPU}")
+            except (ValueError, OSError) as e:
+                logger.warning(f"Could not pin SNMP loop thread to CPU {SNMP_LOOP_CPU}: {str(e)}")
+        self._loop.run_forever()
+    
+    def _make_shared_socket(self):
+        """Create the shared UDP socket, with SO_BUSY_POLL where the kernel and privileges allow"""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setblocking(False)
+        sock.bind(('0.0.0.0', 0))
+        if SNMP_BUSY_POLL_USEC and sys.platform == 'linux':
+            try:
+                # Linux SO_BUSY_POLL is 46; older Pythons don't export the constant
+                sock.setsockopt(socket.SOL_SOCKET, getattr(socket, 'SO_BUSY_POLL', 46), SNMP_BUSY_POLL_USEC)
+            except OSError:
+                pass  # Needs CAP_NET_ADMIN to raise above the sysctl default; plain polling is fine
+        return sock
+    
+    def _run(self, coro, timeout):
+        """Run a coroutine on the shared SNMP loop and block until it finishes.
+        
+        Raises asyncio.TimeoutError if it does not complete within timeout seconds.
+        """
+        future = asyncio.run_coroutine_threadsafe(asyncio.wait_for(coro, timeout=timeout), self._loop)
+        return future.result()
+    
+    def _get_engine(self):
+        """Return the shared SnmpEngine (call from the loop thread)"""
+        with self._lock:
+            if self._engine is None:
+                self._engine = SnmpEngine()
+            return self._engine
+    
+    async def _get_target(self, host, port, timeout, retries):
+        """Return a cached UdpTransportTarget for the endpoint (call from the loop thread)"""
+        key = (host, port, timeout, retries)
+        with self._lock:
+            target = self._transports.get(key)
+        if target is None:
+            target = await UdpTransportTarget.create((host, port), timeout=timeout, retries=retries)
+            with self._lock:
+                target = self._transports.setdefault(key, target)
+        return target
+    
+    def _on_datagram(self, data, addr):
+        """Hand a reply from the shared socket to the request waiting on its request-id (loop thread)"""
+        try:
+            request_id, error_status, error_index, varbinds = snmp_ber.decode_response(data)
+        except ValueError:
+            logger.debug(f"Ignoring undecodable SNMP datagram from {addr}")
+            return
+        entry = self._pending.get(request_id)
+        if entry is None:
+            return
+        future, address = entry
+        # Request-ids are guessable, so only the device the request went to may answer it
+        if tuple(addr[:2]) != tuple(address[:2]):
+            logger.warning(f"Ignoring SNMP reply for request {request_id} from unexpected address {addr}")
+            return
+        if not future.done():
+            future.set_result((error_status, error_index, varbinds))
+    
+    async def _resolve(self, host, port):
+        """Return the cached IPv4 (address, port) for host (call from the loop thread)"""
+        key = (host, port)
+        address = self._addresses.get(key)
+        if address is None:
+            try:
+                infos = await self._loop.getaddrinfo(host, port, family=socket.AF_INET, type=socket.SOCK_DGRAM)
+            except socket.gaierror as e:
+                # Leave unresolvable and IPv6-only hosts to the hlapi path
+                raise ValueError(f"Cannot resolve {host} for the shared socket: {e}")
+            address = self._addresses[key] = infos[0][4]
+        return address
+    
+    async def _fast_get(self, config, oids, timeout=2, retries=1):
+        """GET numeric OIDs with the minimal BER codec over the shared UDP socket (call from the loop thread).
+        
+        Returns (error_status, error_index, [(oid, value), ...]). Raises ValueError for OIDs or hosts
+        this path does not handle and asyncio.TimeoutError if no valid reply arrives; replies the
+        codec cannot decode are dropped, so they also end in a timeout.
+        """
+        if self._transport is None:
+            raise ValueError("Shared SNMP socket is not available")
+        
+        address = await self._resolve(config.host, config.port)
+        request_id = next(self._request_ids) % 0x7FFFFFFF
+        message = snmp_ber.encode_get_request(config.community, request_id, oids)
+        
+        future = self._loop.create_future()
+        self._pending[request_id] = (future, address)
+        try:
+            for attempt in range(retries + 1):
+                self._transport.sendto(message, address)
+                try:
+                    # shield() keeps the future alive across retries of the same request-id
+                    return await asyncio.wait_for(asyncio.shield(future), timeout=timeout)
+                except asyncio.TimeoutError:
+                    continue
+            raise asyncio.TimeoutError()
+        finally:
+            self._pending.pop(request_id, None)
+    
+    def _public_status(self, status):
+        """Convert a stored status entry's monotonic last_check_ns into the UTC datetime callers expect"""
+        return {
+            'connected': status['connected'],
+            'last_check': datetime.utcfromtimestamp(self._wall_offset + status['last_check_ns'] / 1e9),
+            'message': status['message']
+        }
     
     def get_connection_status(self, device_id=None):
         """Get connection status for specific device or all devices"""
-        with self._lock:
-            if device_id:
-                return self._connection_status.get(device_id, {
+        # Status entries are replaced whole, never mutated, and single dict reads/copies are
+        # atomic under the GIL, so no lock is needed here
+        if device_id:
+            status = self._connection_status.get(device_id)
+            if status is None:
+                return {
                     'connected': False,
                     'last_check': None,
                     'message': 'Not connected'
-                })
-            return self._connection_status
+                }
+            return self._public_status(status)
+        statuses = self._connection_status.copy()
+        return {key: self._public_status(status) for key, status in statuses.items()}
     
-    def connect_device(self, config):
-        """Establish connection to SNMP device"""
+    def add_status_listener(self, callback):
+        """Register callback(device_id, connected), called whenever a device's connected flag changes"""
+        self._status_listeners.append(callback)
+    
+    def _set_status(self, device_id, connected, message):
+        """Record a device's status and notify listeners if its connected flag changed"""
+        # Its own small lock, not self._lock, so polls never wait on OID cache work. Reading the
+        # old flag, storing the new one and notifying happen as one step, so listeners always
+        # see the last stored flag even when the reconnect thread and a route race.
+        with self._status_lock:
+            previous = self._connection_status.get(device_id)
+            self._connection_status[device_id] = {
+                'connected': connected,
+                'last_check_ns': time.monotonic_ns(),
+                'message': message
+            }
+            
+            if previous is None or previous.get('connected') != connected:
+                for callback in self._status_listeners:
+                    try:
+                        callback(device_id, connected)
+                    except Exception as e:
+                        logger.error(f"SNMP status listener failed: {str(e)}")
+    
+    async def _probe_one(self, config):
+        """GET sysDescr.0 from a configured device; returns (errorIndication, errorStatus, errorIndex)"""
         try:
-            from pysnmp.hlapi.v3arch.asyncio import (
-                SnmpEngine, CommunityData, 
-                UdpTransportTarget, ContextData, ObjectType, ObjectIdentity,
-                get_cmd
+            iterator = get_cmd(
+                self._get_engine(),
+                _community_data(config.community),
+                await self._get_target(config.host, config.port, 2, 1),
+                _context_data(),
+                _mk_object_type(SYS_DESCR_OID)
             )
-            import asyncio
-            
-            async def test_connection():
-                try:
-                    iterator = get_cmd(
-                        SnmpEngine(),
-                        CommunityData(config.community),
-                        await UdpTransportTarget.create((config.host, config.port), timeout=2, retries=1),
-                        ContextData(),
-                        ObjectType(ObjectIdentity('SNMPv2-MIB', 'sysDescr', 0))
-                    )
-                    
-                    errorIndication, errorStatus, errorIndex, varBinds = await iterator
-                    return errorIndication, errorStatus, errorIndex, varBinds
-                except asyncio.TimeoutError:
-                    return "Request timeout", None, None, None
             
-            # Run async operation with proper cleanup
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            try:
-                errorIndication, errorStatus, errorIndex, varBinds = loop.run_until_complete(
-                    asyncio.wait_for(test_connection(), timeout=5)
-                )
-            except asyncio.TimeoutError:
-                errorIndication = "Connection timeout"
-                errorStatus = None
-            finally:
-                # Cancel all pending tasks
-                pending = asyncio.all_tasks(loop)
-                for task in pending:
-                    task.cancel()
-                # Run loop once more to allow tasks to be cancelled
-                loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
-                loop.close()
-            
-            if errorIndication:
-                with self._lock:
-                    self._connection_status[config.id] = {
-                        'connected': False,
-                        'last_check': datetime.utcnow(),
-                        'message': str(errorIndication)
-                    }
-                logger.debug(f"SNMP connection failed for {config.name}: {errorIndication}")
-                return False, str(errorIndication)
-            elif errorStatus:
-                with self._lock:
-                    self._connection_status[config.id] = {
-                        'connected': False,
-                        'last_check': datetime.utcnow(),
-                        'message': f'{errorStatus.prettyPrint()} at {errorIndex}'
-                    }
-                return False, f'{errorStatus.prettyPrint()} at {errorIndex}'
-            else:
-                with self._lock:
-                    self._connection_status[config.id] = {
-                        'connected': True,
-                        'last_check': datetime.utcnow(),
-                        'message': f'Connected to {config.host}'
-                    }
-                logger.info(f"Connected to SNMP device {config.name} at {config.host}")
-                return True, "Connected successfully"
+            errorIndication, errorStatus, errorIndex, varBinds = await asyncio.wait_for(iterator, timeout=5)
+            return errorIndication, errorStatus, errorIndex
+        except asyncio.TimeoutError:
+            return "Connection timeout", None, None
+    
+    def _record_connect(self, config, outcome):
+        """Store a _probe_one outcome (or the exception it raised) as the device's status; returns (success, message)"""
+        if isinstance(outcome, asyncio.TimeoutError):
+            outcome = ("Connection timeout", None, None)
+        elif isinstance(outcome, Exception):
+            logger.error(f"SNMP connection failed: {str(outcome)}")
+            self._set_status(config.id, False, str(outcome))
+            return False, str(outcome)
+        
+        errorIndication, errorStatus, errorIndex = outcome
+        if errorIndication:
+            self._set_status(config.id, False, str(errorIndication))
+            logger.debug(f"SNMP connection failed for {config.name}: {errorIndication}")
+            return False, str(errorIndication)
+        elif errorStatus:
+            self._set_status(config.id, False, f'{errorStatus.prettyPrint()} at {errorIndex}')
+            return False, f'{errorStatus.prettyPrint()} at {errorIndex}'
+        else:
+            self._set_status(config.id, True, f'Connected to {config.host}')
+            logger.info(f"Connected to SNMP device {config.name} at {config.host}")
+            return True, "Connected successfully"
+    
+    def connect_device(self, config):
+        """Establish connection to SNMP device"""
+        try:
+            outcome = self._run(self._probe_one(config), timeout=6)
         except Exception as e:
-            logger.error(f"SNMP connection failed: {str(e)}")
-            with self._lock:
-                self._connection_status[config.id] = {
-                    'connected': False,
-                    'last_check': datetime.utcnow(),
-                    'message': str(e)
-                }
-            return False, str(e)
+            outcome = e
+        return self._record_connect(config, outcome)
+    
+    def connect_all(self, configs):
+        """Probe several devices concurrently on the shared loop.
+        
+        Takes about one probe timeout however many devices there are. Returns {config.id: (success, message)}.
+        """
+        configs = list(configs)
+        
+        async def probe_all():
+            return await asyncio.gather(*[self._probe_one(config) for config in configs], return_exceptions=True)
+        
+        try:
+            outcomes = self._run(probe_all(), timeout=6)
+        except Exception as e:
+            outcomes = [e] * len(configs)
+        return {config.id: self._record_connect(config, outcome) for config, outcome in zip(configs, outcomes)}
+    
+    def _oid_cache_key(self, config, base_oid):
+        return (config.host, config.port, config.community, base_oid)
+    
+    def _get_cached_columns(self, config, base_oid):
+        """Return the cached walk columns for this device and base OID, or None if missing or expired"""
+        with self._lock:
+            entry = self._oid_cache.get(self._oid_cache_key(config, base_oid))
+        if entry is None:
+            return None
+        walked_at, columns = entry
+        if time.monotonic() - walked_at > self.refresh_oids_cache_interval:
+            return None
+        return columns
     
-    def discover_objects(self, config, base_oid='1.3.6.1.2.1'):
-        """Discover SNMP objects by walking the MIB tree"""
+    def invalidate_oid_cache(self, config=None):
+        """Forget cached walk results for one device, or for every device if config is None"""
+        with self._lock:
+            if config is None:
+                self._oid_cache.clear()
+            else:
+                for key in [k for k in self._oid_cache if k[:3] == (config.host, config.port, config.community)]:
+                    del self._oid_cache[key]
+    
+    def discover_objects(self, config, base_oid='1.3.6.1.2.1', refresh=False):
+        """Discover SNMP objects by walking the MIB tree, as a list of per-object dicts.
+        
+        See discover_columns for caching and refresh.
+        """
+        success, columns = self.discover_columns(config, base_oid, refresh)
+        return success, _column_rows(columns)
+    
+    def discover_columns(self, config, base_oid='1.3.6.1.2.1', refresh=False):
+        """Walk the MIB tree, returning (success, {column: tuple}) for the WALK_COLUMNS.
+        
+        Within refresh_oids_cache_interval of the last walk the cached result is returned instead
+        (its values are as of that walk); pass refresh=True to force a new walk.
+        """
+        if not refresh:
+            cached = self._get_cached_columns(config, base_oid)
+            if cached is not None:
+                logger.debug(f"Using cached SNMP walk for {config.host} with base OID {base_oid}")
+                return True, cached
+        
         logger.info(f"Starting SNMP walk for {config.host} with base OID {base_oid}")
         try:
-            from pysnmp.hlapi.v3arch.asyncio import (
-                SnmpEngine, CommunityData,
-                UdpTransportTarget, ContextData, ObjectType, ObjectIdentity,
-                next_cmd
-            )
-            import asyncio
+            # One list per column rather than a dict per object
+            oids, names, values, data_types = [], [], [], []
             
-            objects = []
+            # Numeric base OIDs are compared as arc tuples, without stringifying each reply; this also
+            # keeps e.g. 1.3.6.1.2.10 from passing as part of 1.3.6.1.2.1. MIB names fall back to text.
+            try:
+                base_arcs = tuple(int(arc) for arc in base_oid.strip('.').split('.'))
+            except ValueError:
+                base_arcs = None
             
             async def walk_mib():
-                nonlocal objects
                 count = 0
                 max_objects = 100  # Limit to prevent overwhelming
                 
                 logger.info(f"Creating SNMP connection to {config.host}:{config.port}")
                 
-                # Create transport target once
-                transport = await UdpTransportTarget.create((config.host, config.port), timeout=5, retries=2)
-                snmpEngine = SnmpEngine()
-                community = CommunityData(config.community)
-                context = ContextData()
+                # Reuse the shared engine and this endpoint's cached transport target
+                transport = await self._get_target(config.host, config.port, 5, 2)
+                snmpEngine = self._get_engine()
+                community = _community_data(config.community)
+                context = _context_data()
                 
                 # Start with the base OID
-                current_oid = ObjectType(ObjectIdentity(base_oid))
+                current_oid = _mk_object_type(base_oid)
                 
                 try:
                     while count < max_objects:
-                        # Use next_cmd with await (not async for)
-                        errorIndication, errorStatus, errorIndex, varBinds = await next_cmd(
+                        # GETBULK returns up to BULK_MAX_REPETITIONS successors per round trip
+                        errorIndication, errorStatus, errorIndex, varBinds = await bulk_cmd(
                             snmpEngine,
                             community,
                             transport,
                             context,
-                            current_oid,
-                            lexicographicMode=False
+                            0, min(BULK_MAX_REPETITIONS, max_objects - count),
+                            current_oid
                         )
                         
                         if errorIndication:
@@ -148,64 +488,52 @@ class SNMPService:
                         if errorStatus:
                             logger.error(f"SNMP error status: {errorStatus.prettyPrint()}")
                             break
+                        
+                        if not varBinds:
+                            break
+                        
+                        # Older pysnmp releases return a table (one row per repetition) rather than a flat list
+                        if not isinstance(varBinds[0], ObjectType):
+                            varBinds = [varBind for row in varBinds for varBind in row]
                             
                         for varBind in varBinds:
                             oid_obj = varBind[0]
                             value_obj = varBind[1]
                             
-                            oid = str(oid_obj)
-                            value = str(value_obj)
+                            if isinstance(value_obj, EndOfMibView):
+                                logger.info(f"Reached end of MIB view at {oid_obj}")
+                                return
                             
                             # Check if we've moved beyond the base OID tree
-                            if not oid.startswith(base_oid):
-                                logger.info(f"Reached end of OID tree at {oid}")
+                            if base_arcs is not None:
+                                in_tree = oid_obj.asTuple()[:len(base_arcs)] == base_arcs
+                            else:
+                                in_tree = str(oid_obj).startswith(base_oid)
+                            if not in_tree:
+                                logger.info(f"Reached end of OID tree at {oid_obj}")
                                 return
                             
+                            oid = str(oid_obj)
+                            value = str(value_obj)
+                            
                             # Extract MIB metadata from ObjectIdentity
                             try:
-                                # Get the label (human-readable name)
-                                if hasattr(oid_obj, 'prettyPrint'):
-                                    pretty_name = oid_obj.prettyPrint()
-                                else:
-                                    pretty_name = str(oid_obj)
-                                
-                                # Extract MIB name from the label if available
-                                name = pretty_name.split('::')[-1].split('.')[0] if '::' in pretty_name else f"OID_{oid.split('.')[-1]}"
-                                
-                                # Get data type from the value object
-                                data_type = type(value_obj).__name__
-                                if hasattr(value_obj, 'prettyPrint'):
-                                    data_type = value_obj.__class__.__name__
-                                
-                                # Extract description if available from MIB
-                                description = f"SNMP OID: {oid}"
-                                
-                                # Infer access type (read-only by default for walk)
-                                access = "read-only"
-                                
-                                # Status is typically 'current' for discovered objects
-                                status = "current"
-                                
+                                # The label looks like "SNMPv2-MIB::sysDescr.0" when the MIB is known
+                                _, separator, label = oid_obj.prettyPrint().rpartition('::')
+                                name = label.partition('.')[0] if separator else ''
                             except Exception as e:
                                 logger.debug(f"Could not extract full metadata for {oid}: {e}")
-                                name = f"OID_{oid.split('.')[-1]}"
-                                data_type = "UNKNOWN"
-                                description = f"SNMP OID: {oid}"
-                                access = "read-only"
-                                status = "current"
+                                name = ''
+                            if not name:
+                                name = f"OID_{oid.rpartition('.')[2]}"
                             
-                            objects.append({
-                                'oid': oid,
-                                'name': name,
-                                'value': value[:50] if len(value) > 50 else value,
-                                'data_type': data_type,
-                                'description': description,
-                                'access': access,
-                                'status': status
-                            })
+                            oids.append(oid)
+                            names.append(name)
+                            values.append(value[:50])
+                            data_types.append(value_obj.__class__.__name__)
                             
                             # Update current OID for next iteration
-                            current_oid = ObjectType(ObjectIdentity(oid))
+                            current_oid = _mk_object_type(oid)
                             
                             count += 1
                             if count >= max_objects:
@@ -217,47 +545,68 @@ class SNMPService:
                 except Exception as e:
                     logger.error(f"Error during SNMP walk: {str(e)}", exc_info=True)
             
-            # Run async operation with proper cleanup
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
             try:
                 logger.info("Running SNMP walk async operation...")
-                loop.run_until_complete(asyncio.wait_for(walk_mib(), timeout=15))
+                self._run(walk_mib(), timeout=15)
             except asyncio.TimeoutError:
                 logger.warning(f"SNMP walk timed out after 15 seconds for {config.host}")
-            finally:
-                # Cancel all pending tasks
-                pending = asyncio.all_tasks(loop)
-                for task in pending:
-                    task.cancel()
-                loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
-                loop.close()
             
-            logger.info(f"✓ Discovered {len(objects)} OIDs from {config.host}")
-            return True, objects
+            logger.info(f"✓ Discovered {len(oids)} OIDs from {config.host}")
+            
+            # Tuples, so cached columns can be handed out without copying
+            columns = dict(zip(WALK_COLUMNS, (tuple(oids), tuple(names), tuple(values), tuple(data_types))))
+            
+            # Only remember walks that found something; a failed or timed-out walk is retried next time
+            if oids:
+                with self._lock:
+                    self._oid_cache[self._oid_cache_key(config, base_oid)] = (time.monotonic(), columns)
+                # Objects may be added from this walk, so reload the config's names on next use
+                if config.id is not None:
+                    self._drop_name_indexes((config.id,))
+            return True, columns
         except Exception as e:
             logger.error(f"SNMP OID discovery failed: {str(e)}", exc_info=True)
-            return False, []
+            return False, {column: () for column in WALK_COLUMNS}
+    
+    def _get_cached_value(self, key):
+        """Return a still-fresh cached read_oid value, or None"""
+        with self._lock:
+            entry = self._value_cache.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if time.monotonic() > expires_at:
+                del self._value_cache[key]
+                return None
+            self._value_cache.move_to_end(key)
+            return value
+    
+    def _cache_value(self, key, value, ttl):
+        with self._lock:
+            self._value_cache[key] = (time.monotonic() + ttl, value)
+            self._value_cache.move_to_end(key)
+            if len(self._value_cache) > VALUE_CACHE_SIZE:
+                self._value_cache.popitem(last=False)
     
     def read_oid(self, snmp_object):
         try:
-            from pysnmp.hlapi.v3arch.asyncio import (
-                SnmpEngine, CommunityData, 
-                UdpTransportTarget, ContextData, ObjectType, ObjectIdentity,
-                get_cmd
-            )
-            import asyncio
-            
             config = snmp_object.config
             
+            # Repeated reads of the same OID within half a polling interval (capped at
+            # VALUE_CACHE_MAX_TTL) are answered from memory instead of another round trip
+            cache_key = (config.id, snmp_object.oid)
+            cached = self._get_cached_value(cache_key)
+            if cached is not None:
+                return True, cached
+            
             async def read_value():
                 try:
                     iterator = get_cmd(
-                        SnmpEngine(),
-                        CommunityData(config.community),
-                        await UdpTransportTarget.create((config.host, config.port), timeout=2, retries=1),
-                        ContextData(),
-                        ObjectType(ObjectIdentity(snmp_object.oid))
+                        self._get_engine(),
+                        _community_data(config.community),
+                        await self._get_target(config.host, config.port, 2, 1),
+                        _context_data(),
+                        _mk_object_type(snmp_object.oid)
                     )
                     
                     errorIndication, errorStatus, errorIndex, varBinds = await iterator
@@ -265,23 +614,11 @@ class SNMPService:
                 except asyncio.TimeoutError:
                     return "Request timeout", None, None, None
             
-            # Run async operation with proper cleanup
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
             try:
-                errorIndication, errorStatus, errorIndex, varBinds = loop.run_until_complete(
-                    asyncio.wait_for(read_value(), timeout=5)
-                )
+                errorIndication, errorStatus, errorIndex, varBinds = self._run(read_value(), timeout=5)
             except asyncio.TimeoutError:
                 errorIndication = "Read timeout"
                 errorStatus = None
-            finally:
-                # Cancel all pending tasks
-                pending = asyncio.all_tasks(loop)
-                for task in pending:
-                    task.cancel()
-                loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
-                loop.close()
             
             if errorIndication:
                 return False, str(errorIndication)
@@ -289,42 +626,151 @@ class SNMPService:
                 return False, f'{errorStatus.prettyPrint()} at {errorIndex}'
             else:
                 for varBind in varBinds:
-                    return True, varBind[1].prettyPrint()
+                    value = varBind[1].prettyPrint()
+                    ttl = min((config.polling_interval or 0) / 2000, VALUE_CACHE_MAX_TTL)
+                    if ttl > 0:
+                        self._cache_value(cache_key, value, ttl)
+                    return True, value
                 return False, "No value returned"
                 
         except Exception as e:
             logger.error(f"OID read failed: {str(e)}")
             return False, str(e)
     
-    def walk_oid(self, config, oid):
+    def read_oids(self, config, snmp_objects):
+        """Read several objects from one device, packing up to READ_OIDS_PER_PDU varbinds into each GET.
+        
+        Numeric OIDs go through the hand-rolled BER codec on the shared socket (_fast_get); the
+        pysnmp hlapi is only used for MIB names and hosts without an IPv4 address.
+        
+        Returns one (success, value) tuple per object, in the same order.
+        """
+        snmp_objects = list(snmp_objects)
+        if not snmp_objects:
+            return []
+        
         try:
-            from pysnmp.hlapi import (
-                nextCmd, SnmpEngine, CommunityData, 
-                UdpTransportTarget, ContextData, ObjectType, ObjectIdentity
-            )
+            chunks = [snmp_objects[i:i + READ_OIDS_PER_PDU] for i in range(0, len(snmp_objects), READ_OIDS_PER_PDU)]
             
-            results = []
+            async def read_chunk(chunk):
+                oids = [obj.oid for obj in chunk]
+                try:
+                    error_status, error_index, varbinds = await self._fast_get(config, oids)
+                    return None, error_status, error_index, [value for _, value in varbinds]
+                except ValueError:
+                    pass  # MIB names, non-IPv4 hosts or no shared socket; use the hlapi
+                except asyncio.TimeoutError:
+                    return "No SNMP response received before timeout", None, None, []
+                except OSError as e:
+                    return str(e), None, None, []
+                
+                errorIndication, errorStatus, errorIndex, varBinds = await get_cmd(
+                    self._get_engine(),
+                    _community_data(config.community),
+                    await self._get_target(config.host, config.port, 2, 1),
+                    _context_data(),
+                    *[_mk_object_type(oid) for oid in oids]
+                )
+                return errorIndication, errorStatus, errorIndex, [varBind[1].prettyPrint() for varBind in varBinds]
+            
+            async def read_values():
+                return await asyncio.gather(*[read_chunk(chunk) for chunk in chunks], return_exceptions=True)
             
-            for (errorIndication, errorStatus, errorIndex, varBinds) in nextCmd(
-                SnmpEngine(),
-                CommunityData(config.community),
-                UdpTransportTarget((config.host, config.port), timeout=2, retries=1),
-                ContextData(),
-                ObjectType(ObjectIdentity(oid)),
-                lexicographicMode=False
-            ):
+            try:
+                chunk_results = self._run(read_values(), timeout=5)
+            except asyncio.TimeoutError:
+                return [(False, "Read timeout")] * len(snmp_objects)
+            
+            results = []
+            for chunk, outcome in zip(chunks, chunk_results):
+                if isinstance(outcome, Exception):
+                    results.extend([(False, str(outcome))] * len(chunk))
+                    continue
+                
+                errorIndication, errorStatus, errorIndex, values = outcome
                 if errorIndication:
-                    return False, str(errorIndication)
+                    results.extend([(False, str(errorIndication))] * len(chunk))
                 elif errorStatus:
-                    return False, f'{errorStatus.prettyPrint()} at {errorIndex}'
+                    # One bad OID fails the whole PDU (e.g. SNMPv1 noSuchName), so read this chunk one by one
+                    results.extend(self.read_oid(obj) for obj in chunk)
                 else:
+                    results.extend((True, value) for value in values[:len(chunk)])
+                    results.extend([(False, "No value returned")] * (len(chunk) - len(values)))
+            return results
+        
+        except Exception as e:
+            logger.error(f"OID batch read failed: {str(e)}")
+            return [(False, str(e))] * len(snmp_objects)
+    
+    def poll_device(self, config, base_oid='1.3.6.1.2.1'):
+        """Read current values for every OID discovered under base_oid.
+        
+        The OID list comes from the walk cache, so steady-state polls are batched GETs
+        (see read_oids) rather than a GETNEXT/GETBULK walk; a walk only happens on a cache
+        miss or once the list is older than refresh_oids_cache_interval.
+        Returns (success, [{'oid': ..., 'value': ...}, ...]) for the OIDs that answered.
+        """
+        cached = self._get_cached_columns(config, base_oid)
+        if cached is None:
+            success, columns = self.discover_columns(config, base_oid, refresh=True)
+            if not success:
+                return False, []
+            # The walk just fetched every value, no need to GET them again
+            return True, [{'oid': oid, 'value': value} for oid, value in zip(columns['oid'], columns['value'])]
+        
+        targets = [SimpleNamespace(oid=oid, config=config) for oid in cached['oid']]
+        values = []
+        for target, (success, value) in zip(targets, self.read_oids(config, targets)):
+            if success:
+                values.append({'oid': target.oid, 'value': value})
+        return True, values
+    
+    def walk_oid(self, config, oid):
+        """Return every (oid, value) under a numeric OID subtree, fetched with GETBULK on the shared loop"""
+        try:
+            base_prefix = oid.strip('.') + '.'
+            results = []
+            
+            async def walk():
+                engine = self._get_engine()
+                target = await self._get_target(config.host, config.port, 2, 1)
+                current_oid = _mk_object_type(oid)
+                
+                while True:
+                    errorIndication, errorStatus, errorIndex, varBinds = await bulk_cmd(
+                        engine,
+                        _community_data(config.community),
+                        target,
+                        _context_data(),
+                        0, WALK_MAX_REPETITIONS,
+                        current_oid
+                    )
+                    if errorIndication:
+                        return False, str(errorIndication)
+                    elif errorStatus:
+                        return False, f'{errorStatus.prettyPrint()} at {errorIndex}'
+                    if not varBinds:
+                        return True, results
+                    
+                    # Older pysnmp releases return a table (one row per repetition) rather than a flat list
+                    if not isinstance(varBinds[0], ObjectType):
+                        varBinds = [varBind for row in varBinds for varBind in row]
+                    
                     for varBind in varBinds:
+                        next_oid = str(varBind[0])
+                        # Leaving the subtree is the lexicographicMode=False stop condition
+                        if isinstance(varBind[1], EndOfMibView) or not next_oid.startswith(base_prefix):
+                            return True, results
                         results.append({
                             'oid': varBind[0].prettyPrint(),
                             'value': varBind[1].prettyPrint()
                         })
+                    current_oid = _mk_object_type(next_oid)
             
-            return True, results
+            try:
+                return self._run(walk(), timeout=30)
+            except asyncio.TimeoutError:
+                return False, "SNMP walk timeout"
                 
         except Exception as e:
             logger.error(f"SNMP walk failed: {str(e)}")
@@ -333,31 +779,10 @@ class SNMPService:
     def write_oid(self, config, oid, value, data_type='INTEGER'):
         """Write value to SNMP OID"""
         try:
-            from pysnmp.hlapi.v3arch.asyncio import (
-                SnmpEngine, CommunityData, 
-                UdpTransportTarget, ContextData, ObjectType, ObjectIdentity,
-                set_cmd
-            )
-            from pysnmp.proto import rfc1902
-            import asyncio
-            
-            # Convert value to appropriate SNMP type
-            snmp_value = None
+            # Convert value to appropriate SNMP type, defaulting to OctetString for unknown types
+            snmp_type, coerce = _WRITE_TYPES.get(data_type.upper(), _DEFAULT_WRITE_TYPE)
             try:
-                if data_type.upper() in ['INTEGER', 'INT', 'COUNTER32', 'GAUGE32']:
-                    snmp_value = rfc1902.Integer32(int(value))
-                elif data_type.upper() in ['STRING', 'OCTETSTRING', 'DISPLAYSTRING']:
-                    snmp_value = rfc1902.OctetString(str(value))
-                elif data_type.upper() in ['COUNTER64']:
-                    snmp_value = rfc1902.Counter64(int(value))
-                elif data_type.upper() in ['UNSIGNED32']:
-                    snmp_value = rfc1902.Unsigned32(int(value))
-                elif data_type.upper() in ['IPADDRESS']:
-                    snmp_value = rfc1902.IpAddress(str(value))
-                else:
-                    # Default to OctetString for unknown types
-                    snmp_value = rfc1902.OctetString(str(value))
-                    
+                snmp_value = snmp_type(coerce(value))
             except (ValueError, TypeError) as e:
                 logger.error(f"Failed to convert value '{value}' to SNMP type '{data_type}': {str(e)}")
                 return False, f"Invalid value for data type {data_type}"
@@ -365,10 +790,10 @@ class SNMPService:
             async def write_value():
                 try:
                     iterator = set_cmd(
-                        SnmpEngine(),
-                        CommunityData(config.community),
-                        await UdpTransportTarget.create((config.host, config.port), timeout=5, retries=2),
-                        ContextData(),
+                        self._get_engine(),
+                        _community_data(config.community),
+                        await self._get_target(config.host, config.port, 5, 2),
+                        _context_data(),
                         ObjectType(ObjectIdentity(oid), snmp_value)
                     )
                     
@@ -377,23 +802,11 @@ class SNMPService:
                 except asyncio.TimeoutError:
                     return "Write timeout", None, None, None
             
-            # Run async operation with proper cleanup
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
             try:
-                errorIndication, errorStatus, errorIndex, varBinds = loop.run_until_complete(
-                    asyncio.wait_for(write_value(), timeout=8)
-                )
+                errorIndication, errorStatus, errorIndex, varBinds = self._run(write_value(), timeout=8)
             except asyncio.TimeoutError:
                 errorIndication = "Write timeout"
                 errorStatus = None
-            finally:
-                # Cancel all pending tasks
-                pending = asyncio.all_tasks(loop)
-                for task in pending:
-                    task.cancel()
-                loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
-                loop.close()
             
             if errorIndication:
                 logger.error(f"SNMP write failed for OID {oid}: {errorIndication}")
@@ -403,41 +816,146 @@ class SNMPService:
                 return False, f'{errorStatus.prettyPrint()} at {errorIndex}'
             else:
                 logger.info(f"Successfully wrote value '{value}' to OID {oid} on {config.host}")
+                # The cached read is now stale
+                with self._lock:
+                    self._value_cache.pop((config.id, oid), None)
                 return True, "Write successful"
                 
         except Exception as e:
             logger.error(f"SNMP write operation failed: {str(e)}")
             return False, str(e)
 
-    def write_by_name(self, config, parameter_name, value):
-        """Write value to SNMP object by parameter name (finds OID by name)"""
-        try:
+    def _register_name_listeners(self):
+        """Drop a config's name index once a change to one of its SNMP object rows is committed"""
+        from sqlalchemy import event
+        from sqlalchemy.orm import Session
+        from models import SNMPObject
+        
+        with self._lock:
+            if self._name_listeners_registered:
+                return
+            # Mapper events fire at flush, before the rows are visible to other sessions, so they
+            # only note the affected configs; the index is dropped when the session commits
+            for event_name in ('after_insert', 'after_update', 'after_delete'):
+                event.listen(SNMPObject, event_name, self._note_name_change)
+            event.listen(Session, 'after_commit', self._apply_name_changes)
+            event.listen(Session, 'after_rollback', self._discard_name_changes)
+            self._name_listeners_registered = True
+    
+    def _note_name_change(self, mapper, connection, target):
+        from sqlalchemy import inspect
+        from sqlalchemy.orm import object_session
+        
+        # An object moved to another config also changes the index of the one it left
+        config_ids = {target.config_id, *inspect(target).attrs.config_id.history.deleted}
+        session = object_session(target)
+        if session is None:
+            self._drop_name_indexes(config_ids)
+        else:
+            session.info.setdefault('snmp_name_changes', set()).update(config_ids)
+    
+    def _apply_name_changes(self, session):
+        config_ids = session.info.pop('snmp_name_changes', None)
+        if config_ids:
+            self._drop_name_indexes(config_ids)
+    
+    def _discard_name_changes(self, session):
+        session.info.pop('snmp_name_changes', None)
+    
+    def _drop_name_indexes(self, config_ids):
+        with self._lock:
+            # Bumped so a load that read the old rows does not store them after this drop
+            self._name_index_generation += 1
+            for config_id in config_ids:
+                self._name_index.pop(config_id, None)
+    
+    def _get_name_index(self, config_id, reload=False):
+        """Get the name -> (id, oid, access, data_type) map for a config, loading it with one query"""
+        index = None if reload else self._name_index.get(config_id)
+        if index is None:
             from models import SNMPObject
             from database import db
             
-            # Find the SNMP object by name and config
-            snmp_object = db.session.query(SNMPObject).filter_by(
-                config_id=config.id, 
-                name=parameter_name
-            ).first()
+            self._register_name_listeners()
+            generation = self._name_index_generation
+            rows = db.session.query(
+                SNMPObject.id, SNMPObject.name, SNMPObject.oid, SNMPObject.access, SNMPObject.data_type
+            ).filter_by(config_id=config_id).order_by(SNMPObject.id.desc()).all()
+            # Descending ids so the lowest id wins for duplicate names, like the old .first()
+            index = {name: (object_id, oid, access, data_type) for object_id, name, oid, access, data_type in rows}
+            with self._lock:
+                if generation == self._name_index_generation:
+                    self._name_index[config_id] = index
+        return index
+    
+    def _enqueue_object_update(self, object_id, value):
+        """Queue a last_value/last_read update for the writer thread (call from an app context)"""
+        with self._lock:
+            if self._writer_thread is None:
+                from sqlalchemy.orm import sessionmaker
+                from database import db
+                
+                # Bound to the engine directly so the writer thread needs no Flask app context
+                self._write_session_factory = sessionmaker(bind=db.engine)
+                self._writer_thread = threading.Thread(target=self._writer_loop, daemon=True, name="SNMP-DB-Writer")
+                self._writer_thread.start()
+        
+        # Blocks while the queue is full, pushing back on the MQTT write handler
+        self._write_queue.put({'id': object_id, 'last_value': str(value), 'last_read': datetime.utcnow()})
+    
+    def _writer_loop(self):
+        """Commit queued last_value updates, one bulk UPDATE and commit per batch"""
+        from models import SNMPObject
+        
+        while True:
+            entry = self._write_queue.get()
+            pending = {entry['id']: entry}
+            deadline = time.monotonic() + WRITE_BATCH_WINDOW
+            while len(pending) < WRITE_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    entry = self._write_queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                pending[entry['id']] = entry  # A later write to the same object wins
+            
+            session = self._write_session_factory()
+            try:
+                session.bulk_update_mappings(SNMPObject, list(pending.values()))
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                logger.error(f"Failed to save {len(pending)} SNMP write value(s): {str(e)}")
+            finally:
+                session.close()
+    
+    def write_by_name(self, config, parameter_name, value):
+        """Write value to SNMP object by parameter name (finds OID by name)"""
+        try:
+            # Find the SNMP object by name and config; a miss reloads once in case the object
+            # was added in bulk (bulk inserts don't fire the invalidation events)
+            entry = self._get_name_index(config.id).get(parameter_name)
+            if entry is None:
+                entry = self._get_name_index(config.id, reload=True).get(parameter_name)
             
-            if not snmp_object:
+            if not entry:
                 logger.warning(f"SNMP object with name '{parameter_name}' not found for config {config.id}")
                 return False, f"Parameter '{parameter_name}' not found"
+            object_id, oid, access, data_type = entry
             
             # Check if the object is writable
-            if snmp_object.access and 'write' not in snmp_object.access.lower():
-                logger.warning(f"SNMP object '{parameter_name}' is not writable (access: {snmp_object.access})")
+            if access and 'write' not in access.lower():
+                logger.warning(f"SNMP object '{parameter_name}' is not writable (access: {access})")
                 return False, f"Parameter '{parameter_name}' is read-only"
             
             # Write to the OID
-            success, message = self.write_oid(config, snmp_object.oid, value, snmp_object.data_type or 'STRING')
+            success, message = self.write_oid(config, oid, value, data_type or 'STRING')
             
             if success:
-                # Update last_value in database
-                snmp_object.last_value = str(value)
-                snmp_object.last_read = datetime.utcnow()
-                db.session.commit()
+                # Update last_value in database (batched by the writer thread)
+                self._enqueue_object_update(object_id, value)
             
             return success, message
             
@@ -445,86 +963,60 @@ class SNMPService:
             logger.error(f"Failed to write by name '{parameter_name}': {str(e)}")
             return False, str(e)
     
+    async def _probe(self, host, port, community, timeout, semaphore):
+        """Return True if host answers a sysDescr GET (runs on the shared loop)"""
+        async with semaphore:
+            try:
+                # Scanned hosts are one-off, so their transports are not cached
+                iterator = get_cmd(
+                    self._get_engine(),
+                    _community_data(community),
+                    await UdpTransportTarget.create((host, port), timeout=timeout, retries=1),
+                    _context_data(),
+                    _mk_object_type(SYS_DESCR_OID)
+                )
+                errorIndication, errorStatus, errorIndex, varBinds = await asyncio.wait_for(iterator, timeout=timeout + 1)
+                return not errorIndication and not errorStatus
+            except Exception:
+                return False
+    
     def detect_devices(self, ip_range, port=161, community='public', version='v2c', timeout=3):
         """Detect SNMP devices in a given IP range"""
-        import ipaddress
-        import threading
-        import asyncio
-        from pysnmp.hlapi.v3arch.asyncio import (
-            SnmpEngine, CommunityData,
-            UdpTransportTarget, ContextData, ObjectType, ObjectIdentity,
-            get_cmd
-        )
-        
         try:
             network = ipaddress.ip_network(ip_range, strict=False)
-            devices = []
-            lock = threading.Lock()
+            hosts = [str(ip) for ip in network.hosts()]
             
-            def check_device(ip):
-                try:
-                    async def test_snmp():
-                        try:
-                            iterator = get_cmd(
-                                SnmpEngine(),
-                                CommunityData(community),
-                                await UdpTransportTarget.create((str(ip), port), timeout=timeout, retries=1),
-                                ContextData(),
-                                ObjectType(ObjectIdentity('SNMPv2-MIB', 'sysDescr', 0))
-                            )
-                            
-                            errorIndication, errorStatus, errorIndex, varBinds = await iterator
-                            return errorIndication, errorStatus, errorIndex, varBinds
-                        except:
-                            return "error", None, None, None
-                    
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-                    try:
-                        errorIndication, errorStatus, errorIndex, varBinds = loop.run_until_complete(
-                            asyncio.wait_for(test_snmp(), timeout=timeout + 1)
-                        )
-                    except asyncio.TimeoutError:
-                        errorIndication = "Timeout"
-                        errorStatus = None
-                    finally:
-                        pending = asyncio.all_tasks(loop)
-                        for task in pending:
-                            task.cancel()
-                        loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
-                        loop.close()
-                    
-                    if not errorIndication and not errorStatus:
-                        with lock:
-                            devices.append({
-                                'host': str(ip),
-                                'port': port,
-                                'community': community,
-                                'version': version,
-                                'polling_interval': 5000
-                            })
-                        logger.info(f"Found SNMP device at {ip}")
-                except:
-                    pass
-            
-            # Create threads to check each IP
-            threads = []
-            batch_size = 10  # Check 10 IPs in parallel
-            
-            for ip in list(network.hosts()):
-                thread = threading.Thread(target=check_device, args=(ip,), daemon=True)
-                thread.start()
-                threads.append(thread)
-                
-                # Limit concurrent threads
-                if len(threads) >= batch_size:
-                    for t in threads:
-                        t.join(timeout=timeout + 2)
-                    threads = [t for t in threads if t.is_alive()]
-            
-            # Wait for remaining threads
-            for thread in threads:
-                thread.join(timeout=timeout + 2)
+            # Each wave of DETECT_CONCURRENCY probes takes at most timeout + 1 seconds
+            waves = max(1, math.ceil(len(hosts) / DETECT_CONCURRENCY))
+            scan_timeout = waves * (timeout + 1) + 1
+            
+            # Probe every host concurrently on the shared loop, at most DETECT_CONCURRENCY at a time.
+            # On timeout the unfinished probes are cancelled and the hosts that answered are kept.
+            async def scan():
+                semaphore = asyncio.Semaphore(DETECT_CONCURRENCY)
+                tasks = {asyncio.ensure_future(self._probe(host, port, community, timeout, semaphore)): host for host in hosts}
+                if not tasks:
+                    return set()
+                done, pending = await asyncio.wait(tasks, timeout=scan_timeout)
+                for task in pending:
+                    task.cancel()
+                if pending:
+                    logger.warning(f"SNMP device detection timed out for {ip_range} with {len(pending)} hosts unprobed")
+                return {tasks[task] for task in done if not task.cancelled() and task.exception() is None and task.result() is True}
+            
+            found_hosts = self._run(scan(), timeout=scan_timeout + 5)
+            
+            devices = []
+            for host in hosts:
+                if host in found_hosts:
+                    devices.append({
+                        'host': host,
+                        'port': port,
+                        'community': community,
+                        'version': version,
+                        'polling_interval': 5000
+                    })
+                    logger.info(f"Found SNMP device at {host}")
             
             logger.info(f"SNMP device detection completed. Found {len(devices)} devices")
             return True, devices